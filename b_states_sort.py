@@ -14,6 +14,48 @@ from collections import deque
 import os
 import re
 
+def depth_order(all_states, change_keys, start_state):
+    """
+    按导航深度排序 page-states: 深的在前，不可达的最前，起始页最后
+
+    Args:
+        all_states: page-states 的 key 列表（原顺序）
+        change_keys: page-change 的 key 列表（形如 "来源_目标_01"）
+        start_state: 起始页面英文名
+
+    Returns:
+        (排序后的 key 列表, {key: 深度})
+    """
+    graph = {}
+    for key in change_keys:
+        parts = key.split('_')
+        if len(parts) >= 3:
+            graph.setdefault(parts[0], set()).add(parts[1])
+
+    # BFS 分层
+    known = set(all_states)
+    levels = {start_state: 0}
+    visited = {start_state}
+    queue = deque([(start_state, 0)])
+
+    while queue:
+        curr, depth = queue.popleft()
+        for ns in graph.get(curr, set()):
+            if ns not in visited and ns in known:
+                visited.add(ns)
+                levels[ns] = depth + 1
+                queue.append((ns, depth + 1))
+
+    # 不可达的页面给最高优先级（最前面）
+    max_depth = max(levels.values()) if levels else 0
+    for s in all_states:
+        if s not in levels:
+            levels[s] = max_depth + 1
+
+    # 按深度降序：深的在前，起始页在最后
+    return sorted(all_states, key=lambda s: -levels[s]), levels
+
+
 def sort_states_file(file_path, start_state):
     """
     读取 states.txt，按导航拓扑排序 page-states，原地覆写
@@ -78,8 +120,8 @@ def sort_states_file(file_path, start_state):
         print(f"   可选: {all_states}")
         return False
 
-    # ========== 3. 从 page-change 构建导航图 ==========
-    graph = {}
+    # ========== 3. 收集 page-change 条目 ==========
+    change_keys = []
     if 'page-change' in section_starts:
         pc_start = section_starts['page-change'] + 1
         pc_end = len(lines)
@@ -90,32 +132,10 @@ def sort_states_file(file_path, start_state):
         for i in range(pc_start, pc_end):
             clean = lines[i].split('#')[0].strip()
             if clean and '=' in clean:
-                key = clean.split('=', 1)[0].strip()
-                parts = key.split('_')
-                if len(parts) >= 3:
-                    graph.setdefault(parts[0], set()).add(parts[1])
+                change_keys.append(clean.split('=', 1)[0].strip())
 
     # ========== 4. BFS 分层 ==========
-    levels = {start_state: 0}
-    visited = {start_state}
-    queue = deque([(start_state, 0)])
-
-    while queue:
-        curr, depth = queue.popleft()
-        for ns in graph.get(curr, set()):
-            if ns not in visited and ns in set(all_states):
-                visited.add(ns)
-                levels[ns] = depth + 1
-                queue.append((ns, depth + 1))
-
-    # 不可达的页面给最高优先级（最前面）
-    max_depth = max(levels.values()) if levels else 0
-    for s in all_states:
-        if s not in levels:
-            levels[s] = max_depth + 1
-
-    # 按深度降序：深的在前，起始页在最后
-    sorted_states = sorted(all_states, key=lambda s: -levels[s])
+    sorted_states, levels = depth_order(all_states, change_keys, start_state)
 
     # ========== 5. 输出信息 ==========
     print(f"📂 文件: {file_path}")
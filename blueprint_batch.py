@@ -0,0 +1,189 @@
+"""
+blueprint_batch.py
+批量状态识别 - 把录制的大量帧分给多个进程识别，结果按帧顺序写成 JSONL
+
+    每个工作进程启动时加载一次模板（进程池 initializer），之后只接收帧；
+    帧按 CHUNK 张一组提交，同时在途的组数有上限，视频不会整段读进内存。
+    目录中的图片只传路径，解码也在工作进程里并行；视频在主进程解码为灰度后分发。
+    tasks 目录换成 templates.bundle 模板包时，各进程映射同一文件，模板只占一份页缓存。
+
+    进程数与线程数: 工作进程里 OpenCV 只用单线程（cv2.setNumThreads(1)），并行全靠进程，
+    否则每个进程各开一个与核数相同的线程池，N 个进程抢 N×核数 个线程，反而变慢。
+    workers=1 时在本进程识别，保留 OpenCV 自己的多线程。workers 默认取 CPU 数，
+    一般不要超过物理核数。
+
+输出每行一个 JSON:
+    {"frame": 帧名, "state": 状态 key 或 null, "section": 节名, "score": 得分,
+     "method": "exact" / "quant" / "match", "fallback": 是否重查,
+     "ms": 识别耗时, "scores": {key: 得分}}
+
+用法:
+    python blueprint_batch.py <tasks目录或模板包> <截图目录或视频> [--out=results.jsonl]
+                              [--workers=4] [--levels=2] [--search=4] [--start=zhuye]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from blueprint_detect import HAS_CV2, StateDetector, to_gray
+
+if HAS_CV2:
+    import cv2
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mkv", ".mov", ".webm"}
+CHUNK = 16                  # 每个任务包含的帧数，摊薄进程间通信的开销
+IN_FLIGHT = 4               # 每个工作进程同时在途的任务数上限
+
+
+# ==================== 帧源 ====================
+def iter_frames(source):
+    """
+    逐帧产出 (帧名, 帧): 目录按文件名排序，帧为路径；视频帧为灰度数组，帧名为 "文件名#序号"
+    """
+    source = Path(source)
+    if source.is_dir():
+        for p in sorted(source.iterdir()):
+            if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES:
+                yield p.name, str(p)
+        return
+    if source.suffix.lower() in VIDEO_SUFFIXES:
+        if not HAS_CV2:
+            print("❌ 读取视频需要 OpenCV (pip install opencv-python)")
+            return
+        cap = cv2.VideoCapture(str(source))
+        try:
+            i = 0
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield f"{source.name}#{i}", to_gray(frame)    # 灰度只有 1/3 大小，传给进程更快
+                i += 1
+        finally:
+            cap.release()
+        return
+    if source.is_file():
+        yield source.name, str(source)
+
+
+# ==================== 工作进程 ====================
+_detector = None
+
+
+def _init_worker(task_dir, options, detector=None):
+    """进程池 initializer: 每个进程只加载一次模板（提示已由主进程打印过）"""
+    global _detector
+    if detector is None:
+        if HAS_CV2:
+            cv2.setNumThreads(1)                # 见模块说明: 进程间并行，进程内不再开线程池
+        with contextlib.redirect_stdout(io.StringIO()):
+            detector = StateDetector.load(task_dir, **options)
+    _detector = detector
+
+
+def _record(name, r):
+    if r is None:
+        return {"frame": name, "state": None, "error": "无法读取"}
+    return {
+        "frame": name,
+        "state": r["state"],
+        "section": r["section"],
+        "score": round(r["score"], 4),
+        "method": r["method"],
+        "fallback": r["fallback"],
+        "ms": round(r["total_ms"], 3),
+        "scores": {k: round(v, 4) for k, v in r["scores"].items()},
+    }
+
+
+def _classify_chunk(chunk):
+    return [_record(name, _detector.classify(frame)) for name, frame in chunk]
+
+
+def _chunks(frames, size):
+    chunk = []
+    for item in frames:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ==================== 批量识别 ====================
+def classify_batch(task_dir, source, workers=None, chunk=CHUNK, **options):
+    """
+    逐帧产出识别记录（顺序与帧源一致）。options 原样传给 StateDetector.load。
+    workers: None / 0 → CPU 数；1 → 在本进程顺序识别
+    """
+    if not workers or workers < 0:
+        workers = os.cpu_count() or 1
+    # 主进程先加载一次: 检查 tasks 目录，并把跳过的状态等提示打印到 stderr（stdout 可能是 JSONL）
+    with contextlib.redirect_stdout(sys.stderr):
+        detector = StateDetector.load(task_dir, **options)
+    if detector is None:
+        return
+    frames = iter_frames(source)
+    if workers == 1:
+        _init_worker(str(task_dir), options, detector)
+        for c in _chunks(frames, chunk):
+            yield from _classify_chunk(c)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(task_dir), options)) as pool:
+        pending = deque()
+        for c in _chunks(frames, chunk):
+            pending.append(pool.submit(_classify_chunk, c))
+            # 在途任务达到上限时先交出最早的结果: 保持顺序，也限制了内存
+            while len(pending) >= workers * IN_FLIGHT:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def run_batch(task_dir, source, out_path=None, workers=None, **options):
+    """识别并写 JSONL（out_path 为 None 时写到标准输出），返回 (帧数, 秒数)"""
+    t0 = time.perf_counter()
+    n = 0
+    out = open(out_path, "w", encoding="utf-8") if out_path else sys.stdout
+    try:
+        for rec in classify_batch(task_dir, source, workers, **options):
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            n += 1
+    finally:
+        if out_path:
+            out.close()
+    return n, time.perf_counter() - t0
+
+
+# ==================== 入口 ====================
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 2:
+        print("用法: python blueprint_batch.py <tasks目录> <截图目录或视频> [--out=results.jsonl]")
+        print("                               [--workers=4] [--levels=2] [--search=4] [--start=zhuye]")
+        sys.exit(1)
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    options = {}
+    if "levels" in opts:
+        options["levels"] = int(opts["levels"])
+        options["early_exit"] = options["levels"] > 0
+    if "search" in opts:
+        options["search"] = int(opts["search"])
+    if "start" in opts:
+        options["start_state"] = opts["start"]
+    out_path = opts.get("out")
+    n, secs = run_batch(args[0], args[1], out_path, int(opts.get("workers", 0)), **options)
+    if n:
+        print(f"✅ {n} 帧，{secs:.2f} 秒，{n / secs:.1f} 帧/秒"
+              + (f" → {out_path}" if out_path else ""), file=sys.stderr)
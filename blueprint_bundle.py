@@ -0,0 +1,191 @@
+"""
+blueprint_bundle.py
+模板包 - 把导出的 tasks/ 目录打成一个可 mmap 的文件
+
+    运行端不必再逐个打开几百个 PNG + LabelMe JSON: 一次 mmap，模板像素直接是
+    文件映射上的 NumPy 只读视图（不复制）；多个 bot 进程映射同一文件时共享一份页缓存。
+
+文件布局（小端）:
+    头部 32 字节   magic "BPBUNDLE" | 版本 u32 | 保留 u32 | 索引偏移 u64 | 索引长度 u64
+    像素区         各框的灰度像素（已按身份框 / 链接框裁剪），每块起点按 64 字节对齐
+    索引           UTF-8 JSON:
+        {"version": 1, "sections": {节名: [{"key", "name", "ref_size": [宽, 高],
+          "boxes": [{"x", "y", "w", "h", "offset"}, ...], "hashes": [...] 或 null}, ...]}}
+        各节条目顺序即 states.txt 中的顺序
+
+用法:
+    python blueprint_bundle.py <tasks目录> [输出文件]      # 默认 <tasks目录>/templates.bundle
+    python blueprint_bundle.py --info <模板包>
+"""
+
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+
+from blueprint_detect import HAS_NUMPY, parse_states_txt, read_labelme
+
+if HAS_NUMPY:
+    import numpy as np
+
+MAGIC = b"BPBUNDLE"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+ALIGN = 64                  # 像素块对齐（缓存行），视图起点对齐便于向量化读取
+BUNDLE_NAME = "templates.bundle"
+BUNDLE_SECTIONS = ("pop-states", "pop-change", "page-states", "page-change")
+
+
+def _pad(f):
+    pos = f.tell()
+    if pos % ALIGN:
+        f.write(b"\0" * (ALIGN - pos % ALIGN))
+    return f.tell()
+
+
+# ==================== 写 ====================
+def _write(f, task_dir, parsed):
+    """把模板包写入可 seek 的二进制流 f，返回框数"""
+    index = {"version": VERSION, "sections": {}}
+    count = 0
+    f.write(b"\0" * HEADER.size)                     # 头部最后回填
+    for section in BUNDLE_SECTIONS:
+        entries = index["sections"][section] = []
+        for key, _, name in parsed.get(section, []):
+            json_path = task_dir / section / f"{key}.json"
+            item = read_labelme(json_path) if json_path.exists() else None
+            if item is None:
+                print(f"⚠️ 跳过 {section}/{key}: 缺少 JSON 或图片")
+                continue
+            ref_size, boxes, hashes = item
+            records = []
+            for x, y, pixels in boxes:
+                offset = _pad(f)
+                f.write(pixels.tobytes())
+                h, w = pixels.shape
+                records.append({"x": x, "y": y, "w": w, "h": h, "offset": offset})
+                count += 1
+            entries.append({
+                "key": key, "name": name, "ref_size": list(ref_size), "boxes": records,
+                "hashes": [[list(r), e, q] for r, e, q in hashes] if hashes else None,
+            })
+    index_offset = _pad(f)
+    data = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    f.write(data)
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, index_offset, len(data)))
+    return count
+
+
+def _parse_tasks(task_dir):
+    if not HAS_NUMPY:
+        print("❌ 模板包需要 NumPy (pip install numpy)")
+        return None
+    txt = Path(task_dir) / "states.txt"
+    if not txt.exists():
+        print(f"❌ 找不到 {txt}")
+        return None
+    return parse_states_txt(txt)
+
+
+def write_bundle(task_dir, path=None):
+    """
+    读取导出的 tasks/ 目录（states.txt + 各节 LabelMe JSON），写出模板包。
+    先写临时文件再改名: 正在映射旧文件的进程不受影响。返回输出路径，失败返回 None
+    """
+    task_dir = Path(task_dir)
+    parsed = _parse_tasks(task_dir)
+    if parsed is None:
+        return None
+    path = Path(path) if path else task_dir / BUNDLE_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        count = _write(f, task_dir, parsed)
+    os.replace(tmp, path)
+    print(f"📦 模板包: {path}（{count} 个框，{path.stat().st_size / 1024:.1f} KB）")
+    return path
+
+
+def bundle_bytes(task_dir):
+    """模板包的完整内容（写入共享内存等场合用），失败返回 None"""
+    task_dir = Path(task_dir)
+    parsed = _parse_tasks(task_dir)
+    if parsed is None:
+        return None
+    f = io.BytesIO()
+    _write(f, task_dir, parsed)
+    return f.getvalue()
+
+
+# ==================== 读 ====================
+class TemplateBundle:
+    """
+    只读映射一个模板包: bundle.sections[节名] 为索引条目列表，
+    bundle.pixels(box) 返回该框像素在映射上的 (h, w) uint8 只读视图。
+    from_buffer() 用于已在内存中的包（如共享内存）。视图存活期间不要 close()
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._attach(mm, mm.close)
+
+    @classmethod
+    def from_buffer(cls, buf, label="", on_close=None):
+        """buf: 支持缓冲区协议的对象（bytes / memoryview / 共享内存的 buf）"""
+        bundle = cls.__new__(cls)
+        bundle.path = Path(label) if label else None
+        bundle._attach(memoryview(buf).toreadonly(), on_close)
+        return bundle
+
+    def _attach(self, buf, on_close):
+        self._buf = buf
+        self._on_close = on_close
+        magic, version, _, index_offset, index_len = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不是模板包或版本不符: {self.path}")
+        index = json.loads(bytes(buf[index_offset:index_offset + index_len]).decode("utf-8"))
+        self.sections = index["sections"]
+
+    @classmethod
+    def open(cls, path):
+        """打开模板包；文件缺失或格式不对返回 None"""
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法打开模板包: {e}")
+            return None
+
+    def pixels(self, box):
+        h, w = box["h"], box["w"]
+        return np.frombuffer(self._buf, dtype=np.uint8, count=h * w,
+                             offset=box["offset"]).reshape(h, w)
+
+    def close(self):
+        if isinstance(self._buf, memoryview):
+            self._buf.release()
+        if self._on_close is not None:
+            self._on_close()
+
+
+# ==================== 入口 ====================
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("用法: python blueprint_bundle.py <tasks目录> [输出文件]")
+        print("      python blueprint_bundle.py --info <模板包>")
+        sys.exit(1)
+    if "--info" in sys.argv:
+        bundle = TemplateBundle.open(args[0])
+        if bundle is None:
+            sys.exit(1)
+        for section, entries in bundle.sections.items():
+            boxes = sum(len(e["boxes"]) for e in entries)
+            print(f"   {section}: {len(entries)} 条，{boxes} 个框")
+        sys.exit(0)
+    sys.exit(0 if write_bundle(args[0], args[1] if len(args) > 1 else None) else 1)
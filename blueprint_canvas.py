@@ -1,12 +1,20 @@
 """
 蓝图画布 - 图片显示、矩形框绘制 / 移动 / 缩放
 """
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
 from PyQt5.QtWidgets import (
-    QGraphicsView, QGraphicsScene,
+    QGraphicsView, QGraphicsScene, QGraphicsItem,
     QGraphicsRectItem, QGraphicsSimpleTextItem,
 )
-from PyQt5.QtCore import Qt, QRectF, QPointF, pyqtSignal
-from PyQt5.QtGui import QPen, QBrush, QColor, QPixmap, QFont, QPainter
+from PyQt5.QtCore import (
+    Qt, QRect, QRectF, QPointF, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer,
+)
+from PyQt5.QtGui import QPen, QBrush, QColor, QPixmap, QImage, QFont, QPainter
 
 
 # ==================== 样式 ====================
@@ -28,6 +36,10 @@ STYLE = {
 HANDLE = 8          # 缩放手柄尺寸
 HANDLE_HALF = 4
 
+TILE = 512                  # 分块边长（像素）
+TILED_MIN_SIDE = 2048       # 长边超过此值的图片才分块渲染
+TILE_CACHE = 192            # 每张图最多保留的分块 QPixmap 数
+
 
 # ==================== 矩形框 ====================
 class BoxItem(QGraphicsRectItem):
@@ -38,6 +50,7 @@ class BoxItem(QGraphicsRectItem):
         self.label = label
         self.target_page = target_page
         self.target_display = ""
+        self.seq = 0                # 加入画布的先后，越大越靠上（命中优先）
         self._text = None
         self._selected = False
         self._apply_style()
@@ -84,6 +97,8 @@ class BoxItem(QGraphicsRectItem):
         }
 
     def handle_at(self, scene_pos):
+        if not self.sceneBoundingRect().contains(scene_pos):
+            return None
         local = self.mapFromScene(scene_pos)
         for name, c in self._handle_centers().items():
             if abs(local.x() - c.x()) < HANDLE and abs(local.y() - c.y()) < HANDLE:
@@ -113,6 +128,224 @@ class BoxItem(QGraphicsRectItem):
         return [[r.x(), r.y()], [r.x() + r.width(), r.y() + r.height()]]
 
 
+# ==================== 分块 + mip-map 图片 ====================
+class TiledImageItem(QGraphicsItem):
+    """
+    大图分块显示: level k 是原图缩小 2^k 倍的 mip 层，每层切成 TILE×TILE 的块。
+    绘制时按当前缩放选层，只画与暴露区域相交的块；
+    mip 层和块 QPixmap 都在首次用到时生成，块按 LRU 保留 TILE_CACHE 个
+    """
+
+    def __init__(self, image, parent=None):
+        super().__init__(parent)
+        self._levels = [image]              # level → QImage
+        self._tiles = OrderedDict()         # (level, tx, ty) → QPixmap
+        self._w, self._h = image.width(), image.height()
+        self.last_level = 0                 # 最近一帧用的层 / 画的块数（帧率浮层显示）
+        self.last_tiles = 0
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)   # 提供 exposedRect
+        self.setZValue(-1)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._w, self._h)
+
+    def _level_image(self, level):
+        while len(self._levels) <= level:
+            prev = self._levels[-1]
+            self._levels.append(prev.scaled(max(1, prev.width() // 2), max(1, prev.height() // 2),
+                                            Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self._levels[level]
+
+    def _tile(self, level, tx, ty):
+        """返回 (QPixmap, 块在 pixmap 中的源矩形, 块宽, 块高)"""
+        key = (level, tx, ty)
+        tile = self._tiles.get(key)
+        if tile is None:
+            img = self._level_image(level)
+            x, y = tx * TILE, ty * TILE
+            w, h = min(TILE, img.width() - x), min(TILE, img.height() - y)
+            # 多切 1 像素边，平滑缩放时块边缘取样到相邻像素，不出现接缝
+            src = QRect(x - 1, y - 1, w + 2, h + 2).intersected(img.rect())
+            tile = (QPixmap.fromImage(img.copy(src)),
+                    QRectF(x - src.x(), y - src.y(), w, h), w, h)
+            self._tiles[key] = tile
+            while len(self._tiles) > TILE_CACHE:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return tile
+
+    def paint(self, painter, option, widget):
+        # 屏幕上 1 像素对应 1/scale 个原图像素，选不超过该倍数的最粗层
+        scale = painter.worldTransform().m11()
+        level = 0
+        while scale * (2 ** (level + 1)) <= 1 and min(self._w, self._h) >> (level + 1) >= 1:
+            level += 1
+        f = 2 ** level
+        img = self._level_image(level)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        x0, y0 = int(exposed.left() / f) // TILE, int(exposed.top() / f) // TILE
+        x1 = min(math.ceil(exposed.right() / f / TILE), math.ceil(img.width() / TILE))
+        y1 = min(math.ceil(exposed.bottom() / f / TILE), math.ceil(img.height() / TILE))
+        n = 0
+        for ty in range(y0, y1):
+            for tx in range(x0, x1):
+                px, src, w, h = self._tile(level, tx, ty)
+                # 目标按原图坐标放置: 该层 1 像素 = 原图 f 像素
+                painter.drawPixmap(QRectF(tx * TILE * f, ty * TILE * f, w * f, h * f), px, src)
+                n += 1
+        self.last_level, self.last_tiles = level, n
+
+
+# ==================== 图片缓存 / 预取 ====================
+class _DecodeSignals(QObject):
+    done = pyqtSignal(str, object, object)  # path, mtime_ns, QImage
+
+
+class _DecodeTask(QRunnable):
+    """后台线程解码图片；QImage 可在非 UI 线程使用，QPixmap 不行"""
+
+    def __init__(self, path, mtime, signals):
+        super().__init__()
+        self.path = path
+        self.mtime = mtime
+        self.signals = signals
+
+    def run(self):
+        self.signals.done.emit(self.path, self.mtime, QImage(self.path))
+
+
+class ImageCache(QObject):
+    """
+    已解码 QImage 的 LRU 缓存，按占用字节数限制容量；
+    prefetch() 把解码交给 QThreadPool，切页时直接命中缓存
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, threads=2, parent=None):
+        super().__init__(parent)
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()        # path → (mtime_ns, QImage)
+        self._bytes = 0
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(threads)
+        self._signals = _DecodeSignals()
+        self._signals.done.connect(self._on_decoded)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, path):
+        """返回 QImage；未缓存时在当前线程解码"""
+        mtime = self._mtime(path)
+        hit = self._images.get(path)
+        if hit and hit[0] == mtime:
+            self._images.move_to_end(path)
+            return hit[1]
+        img = QImage(path)
+        if not img.isNull() and mtime is not None:
+            self._put(path, mtime, img)
+        return img
+
+    def put(self, path, img):
+        """
+        放入已在内存中的图像（刚截的图），切到该页时不必再从磁盘解码；
+        文件尚未写出时按 mtime=None 登记，写完后再 put 一次即可
+        """
+        self._put(path, self._mtime(path), img)
+
+    def prefetch(self, paths):
+        for path in paths:
+            if not path or path in self._pending:
+                continue
+            mtime = self._mtime(path)
+            hit = self._images.get(path)
+            if mtime is None or (hit and hit[0] == mtime):
+                continue
+            self._pending.add(path)
+            self._pool.start(_DecodeTask(path, mtime, self._signals))
+
+    def _on_decoded(self, path, mtime, img):
+        self._pending.discard(path)
+        if not img.isNull():
+            self._put(path, mtime, img)
+
+    def _put(self, path, mtime, img):
+        old = self._images.pop(path, None)
+        if old:
+            self._bytes -= old[1].sizeInBytes()
+        self._images[path] = (mtime, img)
+        self._bytes += img.sizeInBytes()
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, (_, evicted) = self._images.popitem(last=False)
+            self._bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        self._images.clear()
+        self._bytes = 0
+
+
+# ==================== 命中检测网格 ====================
+class BoxGrid:
+    """
+    框的均匀网格索引: 每个框按 sceneBoundingRect（含手柄和标签区域）
+    登记到覆盖的格子里，点查询只看一个格子的候选
+    """
+
+    def __init__(self, cell=128):
+        self.cell = cell
+        self._cells = {}            # (cx, cy) → set(item)
+        self._keys = {}             # item → [(cx, cy), ...]
+
+    def _span(self, rect):
+        c = self.cell
+        return [(cx, cy)
+                for cx in range(math.floor(rect.left() / c), math.floor(rect.right() / c) + 1)
+                for cy in range(math.floor(rect.top() / c), math.floor(rect.bottom() / c) + 1)]
+
+    def insert(self, item):
+        keys = self._span(item.sceneBoundingRect())
+        self._keys[item] = keys
+        for k in keys:
+            self._cells.setdefault(k, set()).add(item)
+
+    def remove(self, item):
+        for k in self._keys.pop(item, ()):
+            bucket = self._cells.get(k)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del self._cells[k]
+
+    def update(self, item):
+        self.remove(item)
+        self.insert(item)
+
+    def at(self, pos):
+        """pos 所在格子的候选框，上层在前"""
+        k = (math.floor(pos.x() / self.cell), math.floor(pos.y() / self.cell))
+        return sorted(self._cells.get(k, ()), key=lambda it: -it.seq)
+
+
+# ==================== 场景池 ====================
+class _PageScene:
+    """一个页面的场景: 图片 + 框图元；dirty 表示框有未同步回模型的修改"""
+    __slots__ = ("scene", "pixmap_item", "box_items", "grid", "path", "mtime", "dirty")
+
+    def __init__(self, scene, path=None, mtime=None):
+        self.scene = scene
+        self.pixmap_item = None
+        self.box_items = []
+        self.grid = BoxGrid()
+        self.path = path
+        self.mtime = mtime
+        self.dirty = False
+
+
 # ==================== 画布 ====================
 class BlueprintCanvas(QGraphicsView):
 
@@ -125,16 +358,18 @@ class BlueprintCanvas(QGraphicsView):
     MODE_LINK     = "link"
     MODE_DEMO     = "demo"
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, pool_size=8, tiled=True):
         super().__init__(parent)
-        self._scene = QGraphicsScene(self)
-        self.setScene(self._scene)
         self.setMouseTracking(True)          # 手柄光标
 
         self.mode = self.MODE_SELECT
-        self.pixmap_item = None
-        self.box_items = []
         self._sel = None
+        self._seq = itertools.count(1)
+
+        # 场景池: 最近访问的 pool_size 个页面保留场景，切回时直接 setScene
+        self.pool_size = pool_size
+        self._pages = OrderedDict()          # key → _PageScene
+        self._activate(_PageScene(QGraphicsScene(self)))
 
         # 绘制
         self._drawing = False
@@ -151,24 +386,166 @@ class BlueprintCanvas(QGraphicsView):
         self.setRenderHint(QPainter.Antialiasing)
         self.setRenderHint(QPainter.SmoothPixmapTransform)
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
         self.setStyleSheet("background-color:#2b2b2b;")
         self.current_page_name = ""
+        self.image_cache = ImageCache(parent=self)
+        self.set_tiled(tiled)
+
+        # 帧率浮层
+        self.show_fps = False
+        self._frames = deque(maxlen=120)     # (结束时刻, 耗时)
+        self._fps_timer = QTimer(self)
+        self._fps_timer.setInterval(500)
+        self._fps_timer.timeout.connect(self._refresh_fps)
+
+    # ==================== 场景切换 ====================
+    def _activate(self, entry):
+        if self._sel:
+            self._sel.set_selected(False)
+            self._sel = None
+        self._reset()
+        self._current = entry
+        self._scene = entry.scene
+        self.pixmap_item = entry.pixmap_item
+        self.box_items = entry.box_items
+        self._grid = entry.grid
+        self.setScene(entry.scene)
+
+    def _new_entry(self, path):
+        """解码图片并建立新场景；失败返回 None"""
+        img = self.image_cache.get(path)
+        if img.isNull():
+            return None
+        entry = _PageScene(QGraphicsScene(self), path, ImageCache._mtime(path))
+        if self.tiled and max(img.width(), img.height()) > TILED_MIN_SIDE:
+            entry.pixmap_item = TiledImageItem(img)
+            entry.scene.addItem(entry.pixmap_item)
+        else:
+            entry.pixmap_item = entry.scene.addPixmap(QPixmap.fromImage(img))
+        entry.scene.setSceneRect(QRectF(0, 0, img.width(), img.height()))
+        return entry
+
+    def show_page(self, key, path):
+        """
+        切换到 key 页面的场景，返回 (成功, 是否复用)
+        池中有且图片未变时直接复用（框图元保持原样），否则新建空场景，
+        由调用方 add_box_from_data 填充
+        """
+        entry = self._pages.get(key)
+        reused = (entry is not None and entry.path == path
+                  and entry.mtime == ImageCache._mtime(path))
+        if not reused:
+            self.drop_page(key)
+            entry = self._new_entry(path)
+            if entry is None:
+                self._activate(_PageScene(QGraphicsScene(self)))
+                return False, False
+            self._pages[key] = entry
+        self._pages.move_to_end(key)
+        self._activate(entry)
+        while len(self._pages) > self.pool_size:
+            _, old = self._pages.popitem(last=False)
+            old.scene.deleteLater()
+        self.fitInView(self._scene.sceneRect(), Qt.KeepAspectRatio)
+        return True, reused
+
+    def drop_page(self, key):
+        """丢弃某页面的池内场景（模型被外部修改时调用）"""
+        entry = self._pages.pop(key, None)
+        if entry is not None and entry is not self._current:
+            entry.scene.deleteLater()
+
+    def clear_pages(self):
+        """清空场景池并显示空白画布（新建 / 打开项目、删除页面后）"""
+        old = list(self._pages.values())
+        self._pages.clear()
+        self._activate(_PageScene(QGraphicsScene(self)))
+        for entry in old:
+            entry.scene.deleteLater()
+
+    # ----- 脏标记: 只有改过的页面才需要同步回模型 -----
+    @property
+    def dirty(self):
+        return self._current.dirty
+
+    def mark_dirty(self):
+        self._current.dirty = True
+
+    def mark_clean(self):
+        self._current.dirty = False
 
     # ==================== 图片 ====================
     def load_image(self, path):
-        self._scene.clear()
-        self.box_items.clear()
-        self._sel = None
-        self._reset()
-        px = QPixmap(path)
-        if px.isNull():
+        """不经场景池直接显示一张图片"""
+        entry = self._new_entry(path)
+        self._activate(entry or _PageScene(QGraphicsScene(self)))
+        if entry is None:
             return False
-        self.pixmap_item = self._scene.addPixmap(px)
-        self._scene.setSceneRect(QRectF(px.rect()))
         self.fitInView(self._scene.sceneRect(), Qt.KeepAspectRatio)
         return True
 
+    def prefetch(self, paths):
+        """后台预解码接下来可能打开的图片"""
+        self.image_cache.prefetch(paths)
+
+    # ==================== 渲染 ====================
+    def set_tiled(self, on):
+        """
+        分块渲染: 大图用 TiledImageItem，视口只重绘变化区域；
+        关闭时恢复整图 QPixmap + 全视口刷新。只影响之后新建的场景
+        """
+        self.tiled = on
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate if on
+                                   else QGraphicsView.FullViewportUpdate)
+
+    def set_show_fps(self, on):
+        self.show_fps = on
+        self._frames.clear()
+        if on:
+            self._fps_timer.start()
+        else:
+            self._fps_timer.stop()
+        self.viewport().update()
+
+    def paintEvent(self, ev):
+        if not self.show_fps:
+            return super().paintEvent(ev)
+        t0 = time.perf_counter()
+        super().paintEvent(ev)
+        t1 = time.perf_counter()
+        self._frames.append((t1, t1 - t0))
+
+    def _fps_rect(self):
+        return QRect(6, 6, 260, 22)
+
+    def _refresh_fps(self):
+        self.viewport().update(self._fps_rect())
+
+    def fps_stats(self):
+        """最近 1 秒的 (帧数, 平均单帧耗时 ms, 最大单帧耗时 ms)"""
+        if not self._frames:
+            return 0, 0.0, 0.0
+        end = self._frames[-1][0]
+        recent = [dt for t, dt in self._frames if end - t <= 1.0]
+        return len(recent), 1000 * sum(recent) / len(recent), 1000 * max(recent)
+
+    def drawForeground(self, painter, rect):
+        if not self.show_fps:
+            return
+        fps, avg, worst = self.fps_stats()
+        text = f"FPS {fps}  帧 {avg:.1f}/{worst:.1f} ms"
+        item = self.pixmap_item
+        if isinstance(item, TiledImageItem):
+            text += f"  L{item.last_level} ×{item.last_tiles}"
+        painter.save()
+        painter.resetTransform()
+        r = self._fps_rect()
+        painter.fillRect(r, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(0, 255, 0))
+        painter.setFont(QFont("Consolas", 9))
+        painter.drawText(r.adjusted(6, 0, 0, 0), Qt.AlignVCenter | Qt.AlignLeft, text)
+        painter.restore()
+
     # ==================== 框增删 ====================
     def add_box_from_data(self, box_type, label, points, target_page=None, target_display=""):
         (x1, y1), (x2, y2) = points
@@ -177,14 +554,35 @@ class BlueprintCanvas(QGraphicsView):
         item.target_display = target_display
         item.update_label_display()
         self._scene.addItem(item)
-        self.box_items.append(item)
+        self._register(item)
         return item
 
+    def _register(self, item):
+        item.seq = next(self._seq)
+        self.box_items.append(item)
+        self._grid.insert(item)
+
+    def box_at(self, pos, demo=False):
+        """
+        场景坐标 pos 处最上层的框；demo=True 时只找有目标的链接框，
+        且按含标签区域的 boundingRect 判断（与演示模式点击一致）
+        """
+        for item in self._grid.at(pos):
+            if demo:
+                if (item.box_type == "link" and item.target_page
+                        and item.boundingRect().contains(item.mapFromScene(pos))):
+                    return item
+            elif item.rect().contains(item.mapFromScene(pos)):
+                return item
+        return None
+
     def remove_selected(self):
         if self._sel and self._sel in self.box_items:
             self._scene.removeItem(self._sel)
             self.box_items.remove(self._sel)
+            self._grid.remove(self._sel)
             self._sel = None
+            self.mark_dirty()
             self.box_selected.emit(None)
             return True
         return False
@@ -245,7 +643,8 @@ class BlueprintCanvas(QGraphicsView):
                     # ← 改动：链接框默认用当前页面中文名
                     self._temp.label = self.current_page_name or f"链接_{n}"
                 self._temp.update_label_display()
-                self.box_items.append(self._temp)
+                self._register(self._temp)
+                self.mark_dirty()
                 self._do_select_item(self._temp)
                 self.box_drawn.emit(self._temp)
             self._temp = None
@@ -254,6 +653,9 @@ class BlueprintCanvas(QGraphicsView):
             self._handle_name = None
             if self._sel:
                 self._sel.update_label_display()
+                if self._sel.rect() != self._rect_start:
+                    self._grid.update(self._sel)
+                    self.mark_dirty()
         else:
             super().mouseReleaseEvent(ev)
 
@@ -284,11 +686,10 @@ class BlueprintCanvas(QGraphicsView):
         if self._sel:
             self._sel.set_selected(False)
             self._sel = None
-        for item in reversed(self.box_items):
-            local = item.mapFromScene(pos)
-            if item.rect().contains(local):
-                self._do_select_item(item)
-                return
+        item = self.box_at(pos)
+        if item:
+            self._do_select_item(item)
+            return
         self.box_selected.emit(None)
 
     def _do_select_item(self, item):
@@ -320,12 +721,9 @@ class BlueprintCanvas(QGraphicsView):
         self._sel.update_label_display()
 
     def _demo_click(self, pos):
-        for item in reversed(self.box_items):
-            if item.box_type == "link" and item.target_page:
-                local = item.mapFromScene(pos)
-                if item.boundingRect().contains(local):
-                    self.link_clicked.emit(item.target_page)
-                    return
+        item = self.box_at(pos, demo=True)
+        if item:
+            self.link_clicked.emit(item.target_page)
 
     def _update_cursor(self, pos):
         if self.mode != self.MODE_SELECT or not self._sel:
@@ -0,0 +1,343 @@
+"""
+blueprint_capture.py
+截图 - 可替换的截图后端 + 工作线程 + 后台 PNG 写盘
+
+    后端       grab() 返回 Frame: 一块连续的 RGB888 缓冲区
+        ScreenBackend   按窗口标题截屏（pyautogui + pygetwindow）
+        ReplayBackend   依次回放目录 / 通配符 / 文件列表中的图片，无界面环境测试用
+    CaptureWorker   单次截图 → captured(Frame)
+    BurstCapture    连拍: 按固定间隔截图，每帧发 frame(Frame)
+    ImageWriter     PNG 编码队列，写完发 written(路径, Frame)
+
+Frame 的缓冲区直接包装成 QImage 用于显示和写盘，中间不做颜色转换和复制。
+工作线程里只使用 QImage（QPixmap 只能在 UI 线程创建）。
+"""
+
+import abc
+import glob
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from blueprint_phash import dhash_image
+
+try:
+    import pyautogui
+    import pygetwindow as gw
+    HAS_CAPTURE = True
+except ImportError:
+    HAS_CAPTURE = False
+
+ACTIVATE_DELAY = 0.3        # 激活窗口后等待重绘的时间（秒）
+BURST_PENDING = 8           # 连拍时待写盘帧数上限，超过则截图线程等待（限制峰值内存）
+REPLAY_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+# ==================== 帧 ====================
+class Frame:
+    """
+    一帧截图: data 为连续的 RGB888 缓冲区，每行 stride 字节
+    grab_ms 为后端截图耗时；phash 为感知哈希，由截图线程算好（见 with_phash）
+    """
+    __slots__ = ("data", "width", "height", "stride", "grab_ms", "phash", "_image")
+
+    def __init__(self, data, width, height, stride=None, grab_ms=0.0):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.stride = stride or width * 3
+        self.grab_ms = grab_ms
+        self.phash = None
+        self._image = None
+
+    @classmethod
+    def from_qimage(cls, img, grab_ms=0.0):
+        """包装已有 QImage 的像素，不复制（非 RGB888 时转换一次）"""
+        if img.format() != QImage.Format_RGB888:
+            img = img.convertToFormat(QImage.Format_RGB888)
+        bits = img.constBits()
+        bits.setsize(img.sizeInBytes())
+        frame = cls(memoryview(bits), img.width(), img.height(), img.bytesPerLine(), grab_ms)
+        frame._image = img
+        return frame
+
+    @property
+    def nbytes(self):
+        return self.stride * self.height
+
+    def qimage(self):
+        """共享 data 的 QImage（PyQt 持有 data 的引用）"""
+        if self._image is None:
+            self._image = QImage(self.data, self.width, self.height, self.stride,
+                                 QImage.Format_RGB888)
+        return self._image
+
+    def with_phash(self):
+        """在当前（截图）线程算好感知哈希，导入时 UI 线程直接使用"""
+        if self.phash is None and not self.isNull():
+            self.phash = dhash_image(self)
+        return self
+
+    def isNull(self):
+        return self.width == 0 or self.height == 0
+
+    def save(self, path, fmt="PNG"):
+        return self.qimage().save(str(path), fmt)
+
+
+# ==================== 后端 ====================
+class CaptureBackend(abc.ABC):
+    """截图后端: open() 截图前的准备（如激活窗口），grab() 返回 Frame，取不到返回 None"""
+
+    name = ""
+    available = True
+
+    def open(self):
+        return True
+
+    @abc.abstractmethod
+    def grab(self):
+        ...
+
+    def close(self):
+        pass
+
+
+class ScreenBackend(CaptureBackend):
+    """按标题找窗口并截取其区域"""
+
+    name = "screen"
+    available = HAS_CAPTURE
+
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self._win = None
+
+    def open(self):
+        if not HAS_CAPTURE or not self.app_name:
+            return False
+        windows = gw.getWindowsWithTitle(self.app_name)
+        if not windows:
+            print(f"❌ 未找到窗口: {self.app_name}")
+            return False
+        win = self._win = windows[0]
+        if win.isMinimized:
+            win.restore()
+        win.activate()
+        time.sleep(ACTIVATE_DELAY)
+        return True
+
+    def grab(self):
+        win = self._win
+        t0 = time.perf_counter()
+        img = pyautogui.screenshot(region=(win.left, win.top, win.width, win.height))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        # PIL 的 RGB 数据本身就是连续的 RGB888，直接作为帧缓冲区
+        return Frame(img.tobytes(), img.width, img.height,
+                     grab_ms=(time.perf_counter() - t0) * 1000)
+
+
+class ReplayBackend(CaptureBackend):
+    """
+    回放已有图片代替截屏: source 为目录、通配符或路径列表，按文件名顺序依次返回，
+    loop=True 时循环，否则取完返回 None
+    """
+
+    name = "replay"
+
+    def __init__(self, source, loop=False):
+        if isinstance(source, (str, Path)):
+            src = Path(source)
+            if src.is_dir():
+                files = sorted(p for p in src.iterdir()
+                               if p.is_file() and p.suffix.lower() in REPLAY_SUFFIXES)
+            else:
+                files = [Path(p) for p in sorted(glob.glob(str(source)))]
+        else:
+            files = [Path(p) for p in source]
+        self.files = files
+        self.loop = loop
+        self._i = 0
+
+    def open(self):
+        if not self.files:
+            print("❌ 回放源中没有图片")
+            return False
+        return True
+
+    def grab(self):
+        if self._i >= len(self.files):
+            if not self.loop or not self.files:
+                return None
+            self._i = 0
+        path = self.files[self._i]
+        self._i += 1
+        t0 = time.perf_counter()
+        img = QImage(str(path))
+        if img.isNull():
+            print(f"❌ 无法读取: {path}")
+            return None
+        return Frame.from_qimage(img, grab_ms=(time.perf_counter() - t0) * 1000)
+
+
+def make_backend(source):
+    """'replay:<目录或通配符>' → ReplayBackend（循环），否则按窗口标题截屏"""
+    if source and source.startswith("replay:"):
+        return ReplayBackend(source[len("replay:"):], loop=True)
+    return ScreenBackend(source)
+
+
+# ==================== 后台写盘 ====================
+class ImageWriter(QObject):
+    """
+    PNG 编码队列: submit() 立即返回，写盘线程先写临时文件再改名，
+    读者不会看到写了一半的图片。写完发 written(路径, 提交的图像)
+    """
+
+    written = pyqtSignal(str, object)
+    failed  = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, image, path):
+        """image: Frame / QImage"""
+        with self._cond:
+            self._pending += 1
+        self._queue.put((image, Path(path)))
+
+    def wait_below(self, n, timeout=None):
+        """等到待写帧数少于 n（连拍的背压）"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending < n, timeout)
+
+    def flush(self, timeout=None):
+        """等待队列写完（保存 / 导出前调用）"""
+        return self.wait_below(1, timeout)
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            image, path = item
+            tmp = path.with_name(path.name + ".tmp")
+            ok = False
+            try:
+                ok = image.save(str(tmp), "PNG")
+                if ok:
+                    os.replace(tmp, path)
+            except Exception as e:              # 编码器的任何异常都不能让写盘线程退出
+                print(f"❌ 写入失败: {path}: {e}")
+                ok = False
+            finally:
+                if not ok:
+                    try:
+                        tmp.unlink()
+                    except OSError:
+                        pass
+                # 无论成败都要计数，否则 flush() 会一直等下去
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+            if ok:
+                self.written.emit(str(path), image)
+            else:
+                self.failed.emit(str(path))
+
+
+# ==================== 单次截图 ====================
+class CaptureWorker(QThread):
+    """单次截图；激活窗口的等待和截图都在本线程，UI 不阻塞"""
+
+    captured = pyqtSignal(object)       # Frame
+    failed   = pyqtSignal(str)
+
+    def __init__(self, backend, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+
+    def run(self):
+        try:
+            frame = self.backend.grab() if self.backend.open() else None
+        except Exception as e:
+            print(f"❌ 截图失败: {e}")
+            frame = None
+        if frame is None or frame.isNull():
+            self.failed.emit("截图失败，请检查目标窗口或回放目录")
+        else:
+            self.captured.emit(frame.with_phash())
+
+
+# ==================== 连拍 ====================
+class BurstCapture(QThread):
+    """
+    连拍: 后端只 open 一次，之后每 interval 秒 grab 一帧并发出 frame；
+    给了 writer 时，待写盘帧数达到 BURST_PENDING 就先等写盘，峰值内存有上限。
+    max_frames=0 表示一直拍到 stop() 或后端取不到帧
+    """
+
+    frame  = pyqtSignal(object)         # Frame
+    failed = pyqtSignal(str)
+    done   = pyqtSignal(int)            # 共截取的帧数
+
+    def __init__(self, backend, writer=None, interval=1.0, max_frames=0, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.writer = writer
+        self.interval = interval
+        self.max_frames = max_frames
+        self._stop = threading.Event()
+        self.captured = 0
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        try:
+            if not self.backend.open():
+                self.failed.emit("截图失败，请检查目标窗口或回放目录")
+                return
+            next_t = time.monotonic()
+            while not self._stop.is_set():
+                if self.writer is not None:
+                    while not self.writer.wait_below(BURST_PENDING, 0.2):
+                        if self._stop.is_set():
+                            return
+                frame = self.backend.grab()
+                if frame is None:
+                    break
+                self.captured += 1
+                self.frame.emit(frame.with_phash())
+                if self.max_frames and self.captured >= self.max_frames:
+                    break
+                # 按固定节拍截图；某次截图超时则从当前时刻重新计时
+                next_t += self.interval
+                delay = next_t - time.monotonic()
+                if delay < 0:
+                    next_t, delay = time.monotonic(), 0
+                self._stop.wait(delay)
+        except Exception as e:
+            self.failed.emit(f"截图失败: {e}")
+        finally:
+            self.done.emit(self.captured)
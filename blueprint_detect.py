@@ -0,0 +1,697 @@
+"""
+blueprint_detect.py
+运行时状态识别 - 加载导出的 tasks/ 目录，把一帧画面归类为页面 / 弹窗状态
+
+    states.txt 中 #pop-states / #page-states 两节的顺序即识别优先级（弹窗在前）；
+    每个状态的 LabelMe JSON 里所有身份框都匹配上（归一化相关系数 ≥ threshold）
+    才算命中，状态得分取各身份框得分的最小值。
+    身份框在记录位置附近 ±search 像素内做模板匹配: 有 OpenCV 时用
+    cv2.matchTemplate，否则用 NumPy 滑窗向量化计算。
+
+    分辨率与参考截图不同时只把每个身份框的搜索窗口缩放到参考尺度，不缩放整帧；
+    所有状态都未命中时，再用 fallback_search 的更大范围重查一遍（界面整体偏移）。
+
+    导出时加了 --hashes 的，json 里带每个身份框像素的哈希（精确 + 量化两种）:
+    帧与参考截图同尺寸时先对同样的矩形取哈希查表，命中即返回，不做相关运算；
+    查不到再走模板匹配。适合像素级稳定的界面。
+
+    levels > 0 时由粗到细: 模板和帧都建 2 倍降采样金字塔，先在第 levels 层
+    的小图上搜索，得分低于 threshold - slack 的直接淘汰，只在最佳位置附近
+    回到原分辨率精修；early_exit 时按优先级命中第一个状态即停止。
+    levels 是速度 / 精度的旋钮: 层数越多越快，但小模板细节丢失、误淘汰风险越大。
+
+用法:
+    python blueprint_detect.py <tasks目录> <截图> [截图 ...] [--threshold=0.8]
+                               [--levels=2] [--search=4] [--fallback=64|full] [--start=zhuye]
+                               [--no-hash]
+    python blueprint_detect.py --bench <蓝图项目目录> [--start=zhuye]    # 基准测试
+"""
+
+import json
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    HAS_CV2 = False
+
+try:
+    from PIL import Image as PILImage
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+STATE_SECTIONS = ("pop-states", "page-states")
+THRESHOLD = 0.8
+SEARCH = 4                  # 身份框允许的位置偏移（像素）
+FALLBACK_SEARCH = 64        # 全部未命中时重查的偏移范围，None 表示不重查
+FULL_FRAME = 1 << 15        # 作为 search 时即整帧搜索
+QUANT_SHIFT = 4             # 量化哈希: 灰度只保留高 4 位，容忍轻微的亮度抖动
+SLACK = 0.15                # 粗层得分低于 threshold - SLACK 即淘汰
+MIN_SIDE = 8                # 金字塔中模板的最小边长，再小就不再降采样
+
+_LINE_RE = re.compile(r'^\s*(\w+)\s*=\s*"([^"]*)"\s*(?:#\s*(.*))?$')
+
+
+# ==================== 读取 ====================
+def parse_states_txt(path):
+    """states.txt → {节名: [(key, 相对路径, 注释), ...]}，保持文件中的顺序"""
+    sections = {}
+    current = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#") and "=" not in line:
+                current = sections.setdefault(line[1:].strip(), [])
+                continue
+            m = _LINE_RE.match(line)
+            if m and current is not None:
+                current.append((m.group(1), m.group(2), m.group(3) or ""))
+    return sections
+
+
+def read_gray(path):
+    """读图为 uint8 灰度数组；读取失败返回 None（兼容中文路径）"""
+    if HAS_CV2:
+        try:
+            buf = np.fromfile(str(path), dtype=np.uint8)
+        except OSError:
+            return None
+        # 先解码为彩色再转灰度，与 to_gray 处理截图帧的结果逐像素一致
+        # （IMREAD_GRAYSCALE 由解码器转换，取整方式不同）
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR) if buf.size else None
+        return None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if HAS_PIL:
+        try:
+            with PILImage.open(str(path)) as img:
+                return np.asarray(img.convert("L"))
+        except OSError:
+            return None
+    return None
+
+
+def to_gray(frame):
+    """帧 → uint8 灰度数组: 路径 / 灰度数组 / BGR(A) 数组（OpenCV 约定）"""
+    if isinstance(frame, (str, Path)):
+        return read_gray(frame)
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        return frame if frame.dtype == np.uint8 else frame.astype(np.uint8)
+    if HAS_CV2:
+        code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code)
+    b, g, r = frame[..., 0], frame[..., 1], frame[..., 2]
+    return (0.114 * b + 0.587 * g + 0.299 * r + 0.5).astype(np.uint8)
+
+
+def _digest(roi, quant=False):
+    """像素块的哈希: CRC32（GB/s 级，身份框矩形已是键的一部分，32 位足够）"""
+    roi = np.ascontiguousarray(roi >> QUANT_SHIFT if quant else roi)
+    return f"{zlib.crc32(roi):08x}"
+
+
+def roi_digests(gray, rect):
+    """
+    灰度图中矩形 (x0, y0, x1, y1) 的 (精确哈希, 量化哈希)，导出和识别共用；
+    矩形超出图片或为空返回 None
+    """
+    x0, y0, x1, y1 = rect
+    if x1 > gray.shape[1] or y1 > gray.shape[0] or x1 <= x0 or y1 <= y0:
+        return None
+    roi = gray[y0:y1, x0:x1]
+    return _digest(roi), _digest(roi, quant=True)
+
+
+def _resize(gray, w, h):
+    if HAS_CV2:
+        return cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+    ys = (np.arange(h) * gray.shape[0] // h)
+    xs = (np.arange(w) * gray.shape[1] // w)
+    return gray[ys][:, xs]
+
+
+def _half(gray):
+    """2 倍降采样（2×2 均值），金字塔的一层"""
+    h, w = gray.shape[0] // 2, gray.shape[1] // 2
+    if HAS_CV2:
+        return cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+    g = gray[:h * 2, :w * 2].astype(np.uint16)
+    return ((g[0::2, 0::2] + g[1::2, 0::2] + g[0::2, 1::2] + g[1::2, 1::2] + 2) // 4).astype(np.uint8)
+
+
+def _match_map(roi, pixels, zn, flat):
+    """roi 中每个位置与模板的得分图 (0~1)"""
+    h, w = pixels.shape
+    if flat:
+        # 纯色: 1 - 平均绝对差 / 255
+        win = np.lib.stride_tricks.sliding_window_view(roi, (h, w))
+        return 1 - np.abs(win.astype(np.int16) - int(pixels[0, 0])).mean(axis=(2, 3)) / 255
+    if HAS_CV2:
+        return cv2.matchTemplate(roi, pixels, cv2.TM_CCOEFF_NORMED)
+    win = np.lib.stride_tricks.sliding_window_view(roi.astype(np.float32), (h, w))
+    n = h * w
+    # 相关系数 = Σ(窗口 · 零均值单位模板) / 窗口零均值范数
+    num = np.einsum("ijkl,kl->ij", win, zn)
+    s1 = win.sum(axis=(2, 3))
+    s2 = np.einsum("ijkl,ijkl->ij", win, win)
+    return num / np.sqrt(np.maximum(s2 - s1 * s1 / n, 1e-6))
+
+
+class FrameView:
+    """
+    帧在某参考分辨率下的视图: crop() 取参考坐标下的矩形，
+    尺寸不同时只缩放取出的这一块（搜索窗口远小于整帧）
+    """
+    __slots__ = ("gray", "shape", "sx", "sy", "same")
+
+    def __init__(self, gray, ref_size=None):
+        h, w = gray.shape
+        ref_w, ref_h = ref_size or (w, h)
+        self.gray = gray
+        self.shape = (ref_h, ref_w)
+        self.sx, self.sy = w / ref_w, h / ref_h
+        self.same = (w, h) == (ref_w, ref_h)
+
+    def crop(self, x0, y0, x1, y1):
+        ref_h, ref_w = self.shape
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(ref_w, x1), min(ref_h, y1)
+        if self.same or x1 <= x0 or y1 <= y0:
+            return self.gray[y0:y1, x0:x1]
+        h, w = self.gray.shape
+        sub = self.gray[int(y0 * self.sy):min(h, int(np.ceil(y1 * self.sy))),
+                        int(x0 * self.sx):min(w, int(np.ceil(x1 * self.sx)))]
+        return _resize(sub, x1 - x0, y1 - y0)
+
+
+# ==================== 模板 ====================
+class Template:
+    """一个身份框: 在参考分辨率下的位置 (x, y)，以及各金字塔层的灰度像素"""
+    __slots__ = ("x", "y", "w", "h", "pixels", "pyramid", "ax", "ay")
+
+    def __init__(self, x, y, pixels, levels=0):
+        self.x, self.y = x, y
+        self.h, self.w = pixels.shape
+        self.pixels = pixels
+        # 粗层模板从坐标为 2^levels 整数倍处开始裁，与帧金字塔的降采样网格对齐，
+        # 否则相位差最多半个粗像素，小模板的粗层得分会明显偏低
+        f = 1 << levels
+        self.ax, self.ay = -x % f, -y % f
+        aligned = pixels[self.ay:, self.ax:]
+        self.pyramid = []                       # 第 n 层: (像素, 零均值单位模板, 是否纯色)
+        p = pixels
+        while True:
+            flat = bool(p.min() == p.max())     # 纯色模板，相关系数无定义
+            zn = None
+            if not HAS_CV2 and not flat:
+                # 零均值单位模板只有 NumPy 回退路径要用；有 OpenCV 时不再另存一份
+                # float32 副本，模板包 / 共享内存中的像素就是唯一的一份
+                t = p.astype(np.float32)
+                t -= t.mean()
+                zn = t / float(np.sqrt((t * t).sum()))
+            self.pyramid.append((p, zn, flat))
+            n = len(self.pyramid)
+            if n > levels or min(aligned.shape) >> n < MIN_SIDE:
+                break
+            p = _half(p if n > 1 else aligned)
+
+    def _best(self, gray, x0, y0, x1, y1, level):
+        """
+        左上角在 [x0, x1) × [y0, y1) 内放置第 level 层模板的最佳 (得分, x, y)
+        gray: 灰度数组或 FrameView
+        """
+        pixels, zn, flat = self.pyramid[level]
+        h, w = pixels.shape
+        x0, y0 = max(0, x0), max(0, y0)
+        if isinstance(gray, FrameView):
+            roi = gray.crop(x0, y0, x1 + w, y1 + h)
+        else:
+            roi = gray[y0:y1 + h, x0:x1 + w]
+        if roi.shape[0] < h or roi.shape[1] < w:
+            return 0.0, x0, y0
+        m = _match_map(roi, pixels, zn, flat)
+        iy, ix = np.unravel_index(int(m.argmax()), m.shape)
+        return float(max(0.0, m[iy, ix])), x0 + int(ix), y0 + int(iy)
+
+    def score(self, gray, search):
+        """在 gray（数组或 FrameView）中 (x, y) 附近 ±search 内的最佳匹配得分 (0~1)"""
+        x, y = self.x, self.y
+        return self._best(gray, x - search, y - search, x + search + 1, y + search + 1, 0)[0]
+
+    def score_pyramid(self, gray, search, reject_below):
+        """
+        由粗到细: 在最粗层搜索，得分低于 reject_below 直接返回（淘汰），
+        否则只在粗层最佳位置对应的 ±2^L 像素内做原分辨率精修。
+        只降采样搜索区域，不对整帧建金字塔。gray 为 FrameView
+        """
+        level = len(self.pyramid) - 1
+        if level == 0:
+            return self.score(gray, search)
+        f = 1 << level
+        ph, pw = self.pyramid[level][0].shape
+        x, y, r = (self.x + self.ax) >> level, (self.y + self.ay) >> level, search // f + 1
+        # 搜索区域（粗层坐标）对应的原图块，左上角落在 f 的整数倍上
+        ox, oy = max(0, x - r), max(0, y - r)
+        region = gray.crop(ox * f, oy * f, (x + r + 1 + pw) * f, (y + r + 1 + ph) * f)
+        for _ in range(level):
+            region = _half(region)
+        coarse, cx, cy = self._best(region, x - r - ox, y - r - oy,
+                                    x + r + 1 - ox, y + r + 1 - oy, level)
+        if coarse < reject_below:
+            return coarse
+        # 粗层命中位置换回原模板左上角，精修窗口不超出原搜索范围
+        cx, cy = (cx + ox) * f - self.ax, (cy + oy) * f - self.ay
+        fx0, fy0 = max(cx - f, self.x - search), max(cy - f, self.y - search)
+        fx1 = min(cx + f + 1, self.x + search + 1)
+        fy1 = min(cy + f + 1, self.y + search + 1)
+        return self._best(gray, fx0, fy0, fx1, fy1, 0)[0]
+
+
+class StateDef:
+    """一个状态: 名称 / 所在节 / 参考分辨率 / 身份框模板 / 身份框哈希"""
+    __slots__ = ("key", "section", "name", "ref_size", "templates", "hashes")
+
+    def __init__(self, key, section, name, ref_size, templates, hashes=None):
+        self.key = key
+        self.section = section
+        self.name = name
+        self.ref_size = ref_size                # (宽, 高)
+        self.templates = templates
+        self.hashes = hashes                    # [(矩形, 精确哈希, 量化哈希), ...] 或 None
+
+    @classmethod
+    def from_labelme(cls, key, section, name, json_path, levels=0):
+        """读取导出的 LabelMe JSON，按身份框裁出模板；图片缺失返回 None"""
+        parsed = read_labelme(json_path)
+        if parsed is None:
+            return None
+        ref_size, boxes, hashes = parsed
+        templates = [Template(x, y, pixels, levels) for x, y, pixels in boxes]
+        return cls(key, section, name, ref_size, templates, hashes)
+
+
+def read_labelme(json_path):
+    """
+    导出的 LabelMe JSON → (参考尺寸 (宽, 高), [(x, y, 框内灰度像素), ...], 哈希列表或 None)
+    图片缺失或没有有效框返回 None
+    """
+    json_path = Path(json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    img = read_gray(json_path.parent / data["imagePath"])
+    if img is None:
+        return None
+    ox, oy = data.get("templateOffset", (0, 0))     # 裁剪导出时图片的偏移
+    ref_w, ref_h = data.get("imageWidth"), data.get("imageHeight")
+    if not ref_w or not ref_h:
+        ref_h, ref_w = img.shape
+    boxes = []
+    for shape in data.get("shapes", []):
+        (ax, ay), (bx, by) = shape["points"]
+        x0, y0 = int(min(ax, bx)), int(min(ay, by))
+        x1, y1 = int(np.ceil(max(ax, bx))), int(np.ceil(max(ay, by)))
+        pixels = img[max(0, y0 - oy):y1 - oy, max(0, x0 - ox):x1 - ox]
+        if pixels.size:
+            boxes.append((x0, y0, np.ascontiguousarray(pixels)))
+    if not boxes:
+        return None
+    hashes = [(tuple(h["rect"]), h["exact"], h["quant"])
+              for h in data.get("roiHashes", [])] or None
+    return (ref_w, ref_h), boxes, hashes
+
+
+def order_page_states(entries, change_keys, start_state):
+    """
+    按 b_states_sort 的导航深度重新排列 page-states（与 sort_states_file
+    写回文件的顺序相同）；entries 为首项是 key 的元组，起始状态不存在时原样返回
+    """
+    by_key = {e[0]: e for e in entries}
+    if start_state not in by_key:
+        print(f"⚠️ 起始状态 '{start_state}' 不在 page-states 中，按原顺序检测")
+        return entries
+    from b_states_sort import depth_order
+    order, _ = depth_order(list(by_key), change_keys, start_state)
+    return [by_key[k] for k in order]
+
+
+# ==================== 识别 ====================
+class StateDetector:
+    """
+    detector = StateDetector.load("XYC2/tasks", levels=2, early_exit=True)
+    result = detector.classify(frame)
+        {"state": 命中的状态 key 或 None, "section": 节名, "score": 得分,
+         "scores": {key: 得分}, "timings": {key: 毫秒}, "total_ms": 总耗时,
+         "fallback": 是否经过扩大范围的重查, "method": "exact" / "quant" / "match"}
+    early_exit 时 scores / timings 只包含实际检查过的状态；重查时为重查的得分；
+    哈希命中时 scores 只有命中的状态，以及排在它前面、没有可用哈希而先做了模板匹配的状态
+    """
+
+    def __init__(self, states, threshold=THRESHOLD, search=SEARCH, levels=0,
+                 slack=SLACK, early_exit=False, fallback_search=FALLBACK_SEARCH,
+                 use_hashes=True):
+        self.states = states                    # 按优先级排列的 StateDef
+        self.threshold = threshold
+        self.search = search
+        self.levels = levels
+        self.slack = slack
+        self.early_exit = early_exit
+        self.fallback_search = fallback_search
+        self.bundle = None                      # from_bundle 加载时持有的文件映射
+        # 哈希表: 参考分辨率 → {"rects": 身份框矩形集合,
+        #                       "exact"/"quant": {(矩形, 哈希): [状态序号, ...]}}
+        self._hash_tables = {}
+        self._hash_need = {}                    # 状态序号 → 需要命中的矩形数
+        if use_hashes:
+            for i, state in enumerate(states):
+                if not state.hashes:
+                    continue
+                self._hash_need[i] = len({rect for rect, _, _ in state.hashes})
+                tables = self._hash_tables.setdefault(
+                    state.ref_size, {"rects": set(), "exact": {}, "quant": {}})
+                for rect, exact, quant in state.hashes:
+                    tables["rects"].add(rect)
+                    tables["exact"].setdefault((rect, exact), []).append(i)
+                    tables["quant"].setdefault((rect, quant), []).append(i)
+
+    @classmethod
+    def load(cls, task_dir, threshold=THRESHOLD, search=SEARCH, levels=0, slack=SLACK,
+             early_exit=False, start_state=None, fallback_search=FALLBACK_SEARCH,
+             use_hashes=True, sections=STATE_SECTIONS):
+        """
+        start_state 给定时按 b_states_sort 的导航深度重新排列 page-states
+        （与 sort_states_file 写回文件的顺序相同），否则按 states.txt 原顺序。
+        task_dir 为文件时按模板包加载（见 from_bundle）
+        """
+        if not HAS_NUMPY:
+            print("❌ 状态识别需要 NumPy (pip install numpy)")
+            return None
+        task_dir = Path(task_dir)
+        if task_dir.is_file():
+            return cls.from_bundle(task_dir, threshold=threshold, search=search, levels=levels,
+                                   slack=slack, early_exit=early_exit, start_state=start_state,
+                                   fallback_search=fallback_search, use_hashes=use_hashes,
+                                   sections=sections)
+        txt = task_dir / "states.txt"
+        if not txt.exists():
+            print(f"❌ 找不到 {txt}")
+            return None
+        parsed = parse_states_txt(txt)
+        if start_state:
+            parsed["page-states"] = order_page_states(
+                parsed.get("page-states", []), [e[0] for e in parsed.get("page-change", [])],
+                start_state)
+        states = []
+        for section in sections:
+            for key, _, name in parsed.get(section, []):
+                json_path = task_dir / section / f"{key}.json"
+                state = (StateDef.from_labelme(key, section, name, json_path, levels)
+                         if json_path.exists() else None)
+                if state is None:
+                    print(f"⚠️ 跳过 {section}/{key}: 缺少 JSON 或图片")
+                    continue
+                states.append(state)
+        return cls(states, threshold, search, levels, slack, early_exit, fallback_search,
+                   use_hashes)
+
+    @classmethod
+    def from_bundle(cls, path, threshold=THRESHOLD, search=SEARCH, levels=0, slack=SLACK,
+                    early_exit=False, start_state=None, fallback_search=FALLBACK_SEARCH,
+                    use_hashes=True, sections=STATE_SECTIONS):
+        """
+        从 blueprint_bundle 模板包加载: 模板像素是文件映射上的只读视图，不读 PNG / JSON。
+        path 也可以是已打开的 TemplateBundle（如共享内存中的包）。映射随识别器存活
+        （detector.bundle）
+        """
+        from blueprint_bundle import TemplateBundle
+        bundle = path if isinstance(path, TemplateBundle) else TemplateBundle.open(path)
+        if bundle is None:
+            return None
+        entries = dict(bundle.sections)
+        if start_state:
+            entries["page-states"] = order_page_states(
+                [(e["key"], e) for e in entries.get("page-states", [])],
+                [e["key"] for e in entries.get("page-change", [])], start_state)
+            entries["page-states"] = [e for _, e in entries["page-states"]]
+        states = []
+        for section in sections:
+            for e in entries.get(section, []):
+                templates = [Template(b["x"], b["y"], bundle.pixels(b), levels)
+                             for b in e["boxes"]]
+                hashes = [(tuple(r), ex, q) for r, ex, q in e["hashes"]] if e["hashes"] else None
+                states.append(StateDef(e["key"], section, e["name"], tuple(e["ref_size"]),
+                                       templates, hashes))
+        detector = cls(states, threshold, search, levels, slack, early_exit, fallback_search,
+                       use_hashes)
+        detector.bundle = bundle
+        return detector
+
+    def lookup(self, frame):
+        """
+        按身份框哈希查表: 返回 (StateDef, "exact" / "quant")，查不到返回 (None, None)。
+        frame 为灰度或 BGR(A) 数组，尺寸须与参考截图一致；只对身份框矩形做灰度转换。
+        只在有哈希的状态之间比较优先级，classify() 还会先匹配排在前面、没有哈希的状态
+        """
+        i, kind = self._lookup(frame)
+        return (None, None) if i is None else (self.states[i], kind)
+
+    def _lookup(self, frame):
+        """同 lookup，返回 (状态序号, 方式)。按优先级逐个状态先比精确哈希、再比量化哈希"""
+        size = (frame.shape[1], frame.shape[0])
+        tables = self._hash_tables.get(size)
+        if not tables:
+            return None, None
+        rois = [(rect, to_gray(frame[rect[1]:rect[3], rect[0]:rect[2]]))
+                for rect in tables["rects"]]
+
+        def first_full(kind, limit):
+            hits = {}                           # 状态序号 → 命中的身份框数
+            for rect, roi in rois:
+                for i in tables[kind].get((rect, _digest(roi, kind == "quant")), ()):
+                    if i < limit:
+                        hits[i] = hits.get(i, 0) + 1
+            return min((i for i, n in hits.items() if n == self._hash_need[i]), default=None)
+
+        best = first_full("exact", len(self.states))
+        # 精确命中的状态之前还有同分辨率的带哈希状态时，才算量化哈希看它们能否命中
+        limit = len(self.states) if best is None else best
+        if any(i < limit and self.states[i].ref_size == size for i in self._hash_need):
+            quant = first_full("quant", limit)
+            if quant is not None:
+                return quant, "quant"
+        return (best, "exact") if best is not None else (None, None)
+
+    def _unhashed_before(self, i, size):
+        """排在第 i 个状态之前、对该分辨率的帧没有可查哈希的状态（只能模板匹配）"""
+        return [s for j, s in enumerate(self.states[:i])
+                if j not in self._hash_need or s.ref_size != size]
+
+    def _frame_at(self, gray, size, cache):
+        """按状态的参考分辨率取帧视图（同一帧同一分辨率只建一次）"""
+        if size not in cache:
+            cache[size] = FrameView(gray, size)
+        return cache[size]
+
+    def score_state(self, state, gray, cache=None, search=None):
+        view = self._frame_at(gray, state.ref_size, {} if cache is None else cache)
+        search = self.search if search is None else search
+        if not self.levels:
+            return min(t.score(view, search) for t in state.templates)
+        # 任一身份框被淘汰，状态即不可能命中，其余框不必再算
+        reject_below = self.threshold - self.slack
+        worst = 1.0
+        for t in state.templates:
+            worst = min(worst, t.score_pyramid(view, search, reject_below))
+            if worst < reject_below:
+                break
+        return worst
+
+    def _scan(self, gray, cache, search, states=None, stop_at_hit=False):
+        scores, timings = {}, {}
+        best = None
+        for state in self.states if states is None else states:
+            ts = time.perf_counter()
+            s = self.score_state(state, gray, cache, search)
+            timings[state.key] = (time.perf_counter() - ts) * 1000
+            scores[state.key] = s
+            if best is None and s >= self.threshold:
+                best = state
+                if self.early_exit or stop_at_hit:
+                    break
+        return best, scores, timings
+
+    def classify(self, frame):
+        t0 = time.perf_counter()
+        frame = read_gray(frame) if isinstance(frame, (str, Path)) else np.asarray(frame)
+        if frame is None:
+            return None
+        if self._hash_tables:
+            i, method = self._lookup(frame)
+            if i is not None:
+                # 哈希命中不能越过优先级更高、却没有哈希可查的状态: 先对它们做模板匹配
+                before = self._unhashed_before(i, (frame.shape[1], frame.shape[0]))
+                scores, timings = {}, {}
+                if before:
+                    gray, cache = to_gray(frame), {}
+                    best, scores, timings = self._scan(gray, cache, self.search, before, True)
+                    if best is not None:
+                        return {
+                            "state": best.key, "section": best.section,
+                            "score": scores[best.key], "scores": scores, "timings": timings,
+                            "total_ms": (time.perf_counter() - t0) * 1000,
+                            "fallback": False, "method": "match",
+                        }
+                state = self.states[i]
+                scores[state.key] = 1.0
+                return {
+                    "state": state.key, "section": state.section, "score": 1.0,
+                    "scores": scores, "timings": timings,
+                    "total_ms": (time.perf_counter() - t0) * 1000,
+                    "fallback": False, "method": method,
+                }
+        gray = to_gray(frame)
+        cache = {}
+        best, scores, timings = self._scan(gray, cache, self.search)
+        fallback = (best is None and self.fallback_search is not None
+                    and self.fallback_search > self.search)
+        if fallback:
+            # 记录位置附近全部未命中，可能界面整体偏移，扩大范围重查
+            best, scores, timings = self._scan(gray, cache, self.fallback_search)
+        return {
+            "state": best.key if best else None,
+            "section": best.section if best else None,
+            "score": scores[best.key] if best else 0.0,
+            "scores": scores,
+            "timings": timings,
+            "total_ms": (time.perf_counter() - t0) * 1000,
+            "fallback": fallback,
+            "method": "match",
+        }
+
+
+# ==================== 基准测试 ====================
+BENCH_CONFIGS = (
+    # (名称, levels, early_exit, 哈希查表)
+    ("全分辨率", 0, False, False),
+    ("全分辨率+提前退出", 0, True, False),
+    ("金字塔 1 层+提前退出", 1, True, False),
+    ("金字塔 2 层+提前退出", 2, True, False),
+    ("金字塔 3 层+提前退出", 3, True, False),
+    ("哈希查表+金字塔 2 层", 2, True, True),
+)
+
+
+def benchmark(project_dir, start_state=None, searches=(SEARCH, 32, FULL_FRAME),
+              shift=(3, 2), scale=1.5, repeat=20):
+    """
+    用项目自带截图做基准: 导出到临时目录后，对每张截图、平移 shift 像素的副本
+    和放大 scale 倍的副本（窗口尺寸不同）分别用 BENCH_CONFIGS 中的配置识别，
+    与同一 search 下全分辨率全量匹配的结果对照准确率，并统计每帧平均耗时。
+    search=FULL_FRAME 即不用记录位置、整帧搜索，作为对照。
+    返回 [(配置名, search, 每帧毫秒, 一致帧数, 总帧数), ...]
+    """
+    import contextlib
+    import io
+    import tempfile
+    from blueprint_export import export_blueprint
+
+    project_dir = Path(project_dir)
+    images = sorted(p for p in (project_dir / "images").iterdir()
+                    if p.suffix.lower() in (".png", ".jpg", ".jpeg", ".bmp"))
+    frames = []
+    for p in images:
+        g = read_gray(p)
+        if g is not None:
+            frames.append(g)
+            frames.append(np.roll(g, shift, axis=(0, 1)))   # 模拟界面整体偏移
+            h, w = g.shape
+            frames.append(_resize(g, int(w * scale), int(h * scale)))   # 窗口尺寸不同
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):       # 导出日志与基准无关
+            ok = export_blueprint(str(project_dir), tmp, roi_hashes=True)
+        if not ok:
+            print(f"❌ 导出失败: {project_dir}")
+            return rows
+        def load(**kw):
+            with contextlib.redirect_stdout(io.StringIO()):
+                return StateDetector.load(tmp, start_state=start_state,
+                                          fallback_search=None, **kw)
+
+        for search in searches:
+            ref = load(search=search, use_hashes=False)
+            expected = [ref.classify(f)["state"] for f in frames]
+            n = repeat if search < FULL_FRAME else 1             # 整帧搜索太慢，只跑一轮
+            for name, levels, early, hashes in BENCH_CONFIGS:
+                det = load(search=search, levels=levels, early_exit=early, use_hashes=hashes)
+                for f in frames:                            # 预热
+                    det.classify(f)
+                t0 = time.perf_counter()
+                for _ in range(n):
+                    got = [det.classify(f)["state"] for f in frames]
+                ms = (time.perf_counter() - t0) * 1000 / (n * len(frames))
+                same = sum(a == b for a, b in zip(got, expected))
+                rows.append((name, search, ms, same, len(frames)))
+    return rows
+
+
+# ==================== 入口 ====================
+def _opt(name, default, cast):
+    for a in sys.argv[1:]:
+        if a.startswith(f"--{name}="):
+            return cast(a.split("=", 1)[1])
+    return default
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    start = _opt("start", None, str)
+    if "--bench" in sys.argv:
+        if not args:
+            print("用法: python blueprint_detect.py --bench <蓝图项目目录> [--start=zhuye]")
+            sys.exit(1)
+        rows = benchmark(args[0], start_state=start)
+        print(f"\n📊 基准: {args[0]}（每张截图 + 平移副本 + 放大副本）")
+        for name, search, ms, same, n in rows:
+            label = "全帧" if search >= FULL_FRAME else search
+            print(f"   search={label:<4} {name:<16} {ms:8.3f} ms/帧   与全量一致 {same}/{n}")
+        sys.exit(0)
+    if len(args) < 2:
+        print("用法: python blueprint_detect.py <tasks目录> <截图> [截图 ...] [--threshold=0.8]")
+        print("                                [--levels=2] [--search=4] [--fallback=64|full]"
+              " [--start=zhuye] [--no-hash]")
+        sys.exit(1)
+    levels = _opt("levels", 0, int)
+    fallback = _opt("fallback", FALLBACK_SEARCH, lambda v: FULL_FRAME if v == "full" else int(v))
+    detector = StateDetector.load(args[0], threshold=_opt("threshold", THRESHOLD, float),
+                                  search=_opt("search", SEARCH, int), levels=levels,
+                                  early_exit=levels > 0, start_state=start,
+                                  fallback_search=fallback or None,
+                                  use_hashes="--no-hash" not in sys.argv)
+    if detector is None:
+        sys.exit(1)
+    print(f"📋 已加载 {len(detector.states)} 个状态，"
+          f"{sum(len(s.templates) for s in detector.states)} 个身份框")
+    for path in args[1:]:
+        r = detector.classify(path)
+        if r is None:
+            print(f"❌ 无法读取: {path}")
+            continue
+        top = sorted(r["scores"].items(), key=lambda kv: -kv[1])[:3]
+        slow = max(r["timings"].items(), key=lambda kv: kv[1]) if r["timings"] else ("-", 0)
+        if r["method"] != "match":
+            print(f"🖼 {path}: {r['state']}（{r['method']} 哈希命中）| {r['total_ms']:.3f} ms")
+            continue
+        print(f"🖼 {path}: {r['state'] or '未识别'} ({r['score']:.3f}) | "
+              f"前三 {', '.join(f'{k}={v:.3f}' for k, v in top)} | "
+              f"{r['total_ms']:.1f} ms（最慢 {slow[0]} {slow[1]:.2f} ms）")
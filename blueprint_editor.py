@@ -12,54 +12,11 @@ from PyQt5.QtWidgets import (
     QCheckBox, QDialog, QDialogButtonBox,
 )
 from PyQt5.QtCore import Qt, QSize, pyqtSignal
-from PyQt5.QtGui import QKeySequence, QPixmap, QImage
+from PyQt5.QtGui import QKeySequence
 
 from blueprint_model import BlueprintProject, Box
 from blueprint_canvas import BlueprintCanvas
-
-# ==================== 窗口截图 ====================
-try:
-    import pyautogui
-    import pygetwindow as gw
-    import cv2
-    import numpy as np
-    HAS_CAPTURE = True
-except ImportError:
-    HAS_CAPTURE = False
-
-
-def capture_by_name(app_name):
-    """根据窗口名称截图，返回 QPixmap"""
-    if not HAS_CAPTURE or not app_name:
-        return None
-    try:
-        windows = gw.getWindowsWithTitle(app_name)
-        if not windows:
-            print(f"❌ 未找到窗口: {app_name}")
-            return None
-        win = windows[0]
-
-        # 激活窗口
-        if win.isMinimized:
-            win.restore()
-        win.activate()
-        import time; time.sleep(0.3)
-
-        # 截图
-        region = (win.left, win.top, win.width, win.height)
-        img = pyautogui.screenshot(region=region)
-        img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-
-        # cv2 → QPixmap
-        h, w, ch = img.shape
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        qimg = QImage(rgb.data, w, h, w * 3, QImage.Format_RGB888)
-        return QPixmap.fromImage(qimg)
-
-    except Exception as e:
-        print(f"❌ 截图失败: {e}")
-        return None
-
+from blueprint_capture import CaptureWorker, BurstCapture, ImageWriter, make_backend
 
 # ==================== 右侧属性面板 ====================
 class PropertyPanel(QWidget):
@@ -67,6 +24,7 @@ class PropertyPanel(QWidget):
     screenshot_requested = pyqtSignal()
     page_info_changed    = pyqtSignal()
     jump_requested       = pyqtSignal(str) 
+    box_edited           = pyqtSignal()
     def __init__(self, parent=None):
         super().__init__(parent)
         self._item = None
@@ -206,9 +164,10 @@ class PropertyPanel(QWidget):
             self.cb_target.blockSignals(False)
 
     def _apply_label(self):
-        if self._item:
+        if self._item and self._item.label != self.ed_label.text():
             self._item.label = self.ed_label.text()
             self._item.update_label_display()
+            self.box_edited.emit()
 
     def _apply_target(self, idx):
         if not self._item or self._item.box_type != "link":
@@ -218,6 +177,7 @@ class PropertyPanel(QWidget):
         txt = self.cb_target.currentText()
         self._item.target_display = txt.rsplit(" (", 1)[0] if pid else ""
         self._item.update_label_display()
+        self.box_edited.emit()
 
 
 # ==================== 主窗口 ====================
@@ -229,11 +189,16 @@ class BlueprintEditor(QMainWindow):
         self.current_page_id = None
         self._navigating = False
         self.app_name = app_name
+        self._backend = make_backend(app_name)
+        self._writer = ImageWriter(self)   # 截图 PNG 后台编码
+        self._capture = None        # 进行中的单次截图线程
+        self._burst = None          # 进行中的连拍线程
 
         self._build_menu()
         self._build_toolbar()
         self._build_central()
         self._connect()
+        self._writer.written.connect(self._on_image_written)
         self._refresh_ui()
 
         title = "蓝图编辑器"
@@ -252,11 +217,23 @@ class BlueprintEditor(QMainWindow):
         self.act_save = m.addAction("保存");      self.act_save.setShortcut("Ctrl+S")
         m.addSeparator()
         self.act_imp  = m.addAction("导入图片");  self.act_imp.setShortcut("Ctrl+I")
+        self.act_imp_dir = m.addAction("批量导入目录"); self.act_imp_dir.setShortcut("Ctrl+Shift+I")
         self.act_cap  = m.addAction("截图导入");  self.act_cap.setShortcut("Ctrl+T")
+        self.act_burst = m.addAction("连拍导入"); self.act_burst.setShortcut("Ctrl+Shift+T")
+        self.act_burst.setCheckable(True)
+        self.act_dedupe = m.addAction("导入时合并重复截图"); self.act_dedupe.setCheckable(True)
+        self.act_dedupe.setChecked(True)
+        self.act_dups = m.addAction("查找重复页面")
         m.addSeparator()
         self.act_export = m.addAction("导出到 tasks/"); self.act_export.setShortcut("Ctrl+E")
         # 删除了 self.act_win
 
+        v = self.menuBar().addMenu("视图(&V)")
+        self.act_tiled = v.addAction("大图分块渲染"); self.act_tiled.setCheckable(True)
+        self.act_tiled.setChecked(True)
+        self.act_fps = v.addAction("显示帧率");     self.act_fps.setCheckable(True)
+        self.act_fps.setShortcut("F12")
+
 
     def _build_toolbar(self):
         tb = QToolBar("工具"); tb.setIconSize(QSize(24, 24)); self.addToolBar(tb)
@@ -301,9 +278,14 @@ class BlueprintEditor(QMainWindow):
         self.act_open.triggered.connect(self._on_open)
         self.act_save.triggered.connect(self._on_save)
         self.act_imp.triggered.connect(self._on_import)
+        self.act_imp_dir.triggered.connect(self._on_import_dir)
         self.act_cap.triggered.connect(self._on_capture)
+        self.act_burst.triggered.connect(self._on_burst)
+        self.act_dups.triggered.connect(self._on_find_dups)
         self.act_export.triggered.connect(self._on_export)
         self.act_export_btn.triggered.connect(self._on_export)
+        self.act_tiled.toggled.connect(self._on_toggle_tiled)
+        self.act_fps.toggled.connect(self.canvas.set_show_fps)
         # 删除了 self.act_win.triggered.connect(self._on_pick_window)
 
         self.act_sel.triggered.connect(lambda:  self._set_mode("select"))
@@ -325,11 +307,13 @@ class BlueprintEditor(QMainWindow):
         self.prop.screenshot_requested.connect(self._on_cap_target)
         self.prop.page_info_changed.connect(self._on_page_info)
         self.prop.jump_requested.connect(self._on_link_jump)
+        self.prop.box_edited.connect(self.canvas.mark_dirty)
 
     def _refresh_ui(self):
         hp = self.project is not None
         hpg = self.current_page_id is not None
         self.act_save.setEnabled(hp); self.act_imp.setEnabled(hp); self.act_cap.setEnabled(hp)
+        self.act_imp_dir.setEnabled(hp); self.act_burst.setEnabled(hp); self.act_dups.setEnabled(hp)
         self.btn_add.setEnabled(hp);  self.btn_cap.setEnabled(hp); self.btn_rm.setEnabled(hpg)
         for a in (self.act_sel, self.act_ibox, self.act_lbox, self.act_demo):
             a.setEnabled(hpg)
@@ -341,7 +325,8 @@ class BlueprintEditor(QMainWindow):
         self._on_save()
         out = str(self.project.project_dir / "tasks")
         from blueprint_export import export_blueprint
-        ok = export_blueprint(str(self.project.project_dir), out)
+        ok = export_blueprint(str(self.project.project_dir), out,
+                              incremental=True, workers=None, image_mode="hardlink")
         if ok:
             QMessageBox.information(self, "导出成功", f"已导出到:\n{out}")
             self.statusBar().showMessage(f"✅ 已导出到: {out}")
@@ -357,28 +342,40 @@ class BlueprintEditor(QMainWindow):
                 "demo":"演示模式 — 点击绿色框跳转"}
         self.statusBar().showMessage(tips.get(m,""))
 
+    def _on_toggle_tiled(self, on):
+        """切换渲染方式后重建场景池，当前页重新载入"""
+        self._save_boxes()
+        self.canvas.set_tiled(on)
+        self.canvas.clear_pages()
+        item = self.page_list.currentItem()
+        if item is not None:
+            self._on_page_changed(item, None)
+
     # ========== 项目 ==========
     def _on_new(self):
         name, ok = QInputDialog.getText(self, "新建项目", "项目名称:")
         if not ok or not name.strip(): return
         d = QFileDialog.getExistingDirectory(self, "保存位置")
         if not d: return
-        self.project = BlueprintProject(name.strip(), Path(d)/name.strip())
+        self.project = BlueprintProject(name.strip(), Path(d)/name.strip(), journal=True)
         self.project.create()
         self.current_page_id = None
-        self.page_list.clear(); self.canvas._scene.clear(); self.canvas.box_items.clear()
+        self.page_list.clear(); self.canvas.clear_pages()
         self.prop.show_page(None); self.prop.show_box(None)
         self.setWindowTitle(f"蓝图编辑器 — {name}")
         self._refresh_ui()
 
     def _on_open(self):
-        fp,_ = QFileDialog.getOpenFileName(self, "打开","","project.json (project.json)")
+        fp,_ = QFileDialog.getOpenFileName(self, "打开","",
+                                           "蓝图项目 (project.json project.db)")
         if not fp: return
-        try: self.project = BlueprintProject.load(Path(fp).parent)
+        backend = "sqlite" if Path(fp).suffix == ".db" else "json"
+        try: self.project = BlueprintProject.load(Path(fp).parent, lazy=True, journal=True,
+                                                  backend=backend)
         except Exception as e: return QMessageBox.critical(self,"错误",str(e))
         self.current_page_id = None
         self._reload_list(); self._sync_targets()
-        self.canvas._scene.clear(); self.canvas.box_items.clear()
+        self.canvas.clear_pages()
         self.prop.show_page(None); self.prop.show_box(None)
         self.setWindowTitle(f"蓝图编辑器 — {self.project.name}")
         self._refresh_ui()
@@ -387,69 +384,188 @@ class BlueprintEditor(QMainWindow):
         if not self.project: return
         self._apply_page_info()
         self._save_boxes()
+        self._writer.flush()                  # 截图 PNG 全部落盘后再改名 / 探测
         for pid in self.project._page_order:
             p = self.project.pages[pid]
             if p.name_en:
                 self.project.rename_page_image(pid, p.name_en)
+        # 只补齐刚写盘的截图；其余页面的图片信息在取用 / 导出时才检查，不在这里逐张解码
+        self.project.refresh_written_images()
         self.project.save()
         self.statusBar().showMessage("✅ 已保存")
 
     # ========== 截图 ==========
-    def _do_capture(self):
-        """执行截图，返回 QPixmap 或 None"""
-        if not HAS_CAPTURE:
-            QMessageBox.warning(self, "缺少依赖",
-                                "请安装: pip install pyautogui pygetwindow opencv-python numpy")
-            return None
+    def _can_capture(self):
+        if not self._backend.available:
+            QMessageBox.warning(self, "缺少依赖", "请安装: pip install pyautogui pygetwindow")
+            return False
         if not self.app_name:
             QMessageBox.warning(self, "提示", "未指定目标窗口名称，请在启动时传入 app_name")
-            return None
-        px = capture_by_name(self.app_name)
-        if not px or px.isNull():
-            QMessageBox.warning(self, "错误", f"截图失败，未找到窗口: {self.app_name}")
-            return None
-        return px
+            return False
+        return True
+
+    def _do_capture(self, on_done):
+        """后台截图，成功后在 UI 线程调用 on_done(Frame)"""
+        if not self._can_capture() or self._capture is not None or self._burst is not None:
+            return                                  # 缺依赖 / 上一次还没拍完
+        self._capture = CaptureWorker(self._backend, self)
+        self._capture.captured.connect(on_done)
+        self._capture.failed.connect(lambda msg: QMessageBox.warning(self, "错误", msg))
+        self._capture.finished.connect(self._on_capture_finished)
+        self._capture.start()
+        self.statusBar().showMessage(f"📷 正在截图: {self.app_name} ...")
+
+    def _on_capture_finished(self):
+        self._capture.deleteLater()
+        self._capture = None
+
+    def _import_frame(self, frame):
+        """
+        加为页面: PNG 交给后台写盘，图像直接放进画布缓存供显示
+        返回 (页面, 是否新页面)；与已有页面重复且开启合并时返回那个已有页面
+        """
+        n = len(self.project.pages)
+        page = self.project.import_screenshot(frame, self._writer, self._dup_policy())
+        if len(self.project.pages) == n:
+            return page, False
+        self.canvas.image_cache.put(self.project.get_image_abs_path(page.page_id), frame.qimage())
+        return page, True
+
+    def _on_image_written(self, path, frame):
+        # 文件落盘后 mtime 变了，按新 mtime 重新登记，避免再从磁盘解码
+        self.canvas.image_cache.put(path, frame.qimage())
 
     def _on_capture(self):
         """菜单/按钮：截图导入为新页面"""
         if not self.project:
             return
-        px = self._do_capture()
-        if not px:
+        self._do_capture(self._import_captured)
+
+    def _import_captured(self, frame):
+        if not self.project:
             return
-        page = self.project.import_screenshot(px)
-        self._after_import(page)
+        self._after_import(*self._import_frame(frame))
 
     def _on_cap_target(self):
         """属性面板：截图导入并设为链接目标"""
         if not self.project:
             return
-        px = self._do_capture()
-        if not px:
-            return
-        page = self.project.import_screenshot(px)
-        self._after_target(page)
+        self._do_capture(self._target_captured)
 
+    def _target_captured(self, frame):
+        if not self.project:
+            return
+        self._after_target(self._import_frame(frame)[0])
+
+    # ---------- 连拍 ----------
+    def _on_burst(self, on):
+        if not on:
+            if self._burst is not None:
+                self._burst.stop()
+                self.statusBar().showMessage("⏹ 正在停止连拍 ...")
+            return
+        if (not self.project or self._burst is not None or self._capture is not None
+                or not self._can_capture()):
+            self.act_burst.setChecked(False)
+            return
+        interval, ok = QInputDialog.getDouble(self, "连拍导入", "截图间隔（秒）:", 1.0, 0.1, 60.0, 1)
+        if not ok:
+            self.act_burst.setChecked(False)
+            return
+        self._burst_pages = []
+        self._burst_dups = 0
+        self._burst_ms = 0.0
+        self._burst_project = self.project
+        self._burst = BurstCapture(self._backend, self._writer, interval=interval, parent=self)
+        self._burst.frame.connect(self._on_burst_frame)
+        self._burst.failed.connect(lambda msg: QMessageBox.warning(self, "错误", msg))
+        self._burst.done.connect(self._on_burst_done)
+        self._burst.start()
+        self.statusBar().showMessage(f"⏺ 连拍中（每 {interval:g} 秒），再次点击“连拍导入”停止")
+
+    def _on_burst_frame(self, frame):
+        """每截到一帧调用一次: 分配页面 ID，写盘在后台进行"""
+        if self.project is not self._burst_project:
+            return                                  # 连拍途中换了项目
+        page, new = self._import_frame(frame)
+        self._burst_ms += frame.grab_ms
+        if new:
+            self._burst_pages.append(page)
+            item = QListWidgetItem(page.display_name)
+            item.setData(Qt.UserRole, page.page_id)
+            self.page_list.addItem(item)
+        else:
+            self._burst_dups += 1
+        n = len(self._burst_pages) + self._burst_dups
+        self.statusBar().showMessage(
+            f"⏺ 连拍中: 已导入 {len(self._burst_pages)} 张，跳过重复 {self._burst_dups} 张 | "
+            f"截图 {self._burst_ms / n:.0f} ms/张 | 待写盘 {self._writer.pending}")
+
+    def _on_burst_done(self, n):
+        self._burst.deleteLater()
+        self._burst = None
+        self.act_burst.setChecked(False)
+        if self._burst_pages and self.project is self._burst_project:
+            self._on_save()
+            self._reload_list(reselect=self.current_page_id); self._sync_targets()
+        self.statusBar().showMessage(
+            f"✅ 连拍结束，共导入 {len(self._burst_pages)} 张，跳过重复 {self._burst_dups} 张")
 
     # ========== 导入 ==========
     def _on_import(self):
         if not self.project: return
         fp,_ = QFileDialog.getOpenFileName(self,"选择图片","","图片 (*.png *.jpg *.jpeg *.bmp)")
         if not fp: return
-        page = self.project.import_image(fp)
-        self._after_import(page)
+        n = len(self.project.pages)
+        page = self.project.import_image(fp, on_duplicate=self._dup_policy())
+        self._after_import(page, len(self.project.pages) > n)
+
+    def _on_import_dir(self):
+        if not self.project: return
+        d = QFileDialog.getExistingDirectory(self, "选择截图目录")
+        if not d: return
+        pages = self.project.import_images(d, on_duplicate=self._dup_policy())
+        if not pages:
+            self.statusBar().showMessage("⚠️ 目录中没有图片，或全部与已有页面重复"); return
+        self._on_save()
+        self._reload_list(); self._sync_targets()
+        self._select_in_list(pages[0].page_id)
+        self.statusBar().showMessage(f"✅ 已批量导入 {len(pages)} 张图片")
 
-    def _after_import(self, page):
+    def _after_import(self, page, new=True):
+        if not new:
+            self._select_in_list(page.page_id)
+            self.statusBar().showMessage(f"🔁 与已有页面重复，未导入: {page.display_name}")
+            return
         self._reload_list(); self._sync_targets()
         self._select_in_list(page.page_id)
-        self.statusBar().showMessage(f"✅ 已导入: {page.page_id}")
+        msg = f"✅ 已导入: {page.page_id}"
+        similar = self.project.similar_pages(page.page_id)
+        if similar:
+            pid, d = similar[0]
+            msg += f" | ⚠️ 与 {self.project.pages[pid].display_name} 相似（差 {d} 位）"
+        self.statusBar().showMessage(msg)
+
+    def _dup_policy(self):
+        return "merge" if self.act_dedupe.isChecked() else "keep"
+
+    def _on_find_dups(self):
+        if not self.project: return
+        self._writer.flush()
+        groups = self.project.find_duplicates()
+        if not groups:
+            QMessageBox.information(self, "查找重复页面", "未发现重复页面"); return
+        names = self.project.get_page_names()
+        lines = ["、".join(names[pid] for pid in g) for g in groups]
+        QMessageBox.information(self, "查找重复页面",
+                                f"发现 {len(groups)} 组近似重复的页面:\n\n" + "\n".join(lines))
 
     def _on_remove(self):
         if not self.project or not self.current_page_id: return
         if QMessageBox.question(self,"确认","删除此页面？") != QMessageBox.Yes: return
         self.project.remove_page(self.current_page_id)
         self.current_page_id = None
-        self.canvas._scene.clear(); self.canvas.box_items.clear()
+        self.canvas.clear_pages()
         self.prop.show_page(None); self.prop.show_box(None)
         self._reload_list(); self._sync_targets(); self._refresh_ui()
 
@@ -461,7 +577,10 @@ class BlueprintEditor(QMainWindow):
         self.current_page_id = pid
         page = self.project.pages[pid]
         img = self.project.get_image_abs_path(pid)
-        if img and self.canvas.load_image(img):
+        ok, reused = self.canvas.show_page(pid, img) if img else (False, False)
+        if reused:
+            self._refresh_box_displays()          # 池中场景: 目标页可能已改名
+        elif ok:
             for b in page.boxes:
                 td = ""
                 if b.target_page and b.target_page in self.project.pages:
@@ -471,6 +590,16 @@ class BlueprintEditor(QMainWindow):
         self.prop.show_page(page); self.prop.show_box(None)
         self._refresh_ui()
         if not self._navigating: self._set_mode("select")
+        self._prefetch_around(pid)
+
+    def _prefetch_around(self, pid):
+        """预取列表中相邻页面和本页链接目标的图片"""
+        order = self.project._page_order
+        i = order.index(pid)
+        near = order[max(0, i - 2):i] + order[i + 1:i + 3]
+        targets = list(self.project.outgoing_links(pid))
+        self.canvas.prefetch([self.project.get_image_abs_path(p)
+                              for p in targets + near if p in self.project.pages])
 
     def _on_page_info(self):
         if not self.project or not self.current_page_id: return
@@ -482,7 +611,7 @@ class BlueprintEditor(QMainWindow):
 
         self._reload_list(reselect=self.current_page_id)
         self._sync_targets()
-        self._refresh_box_displays()  
+        self._refresh_box_displays(self.current_page_id)
 
     def _apply_page_info(self):
         if not self.project or not self.current_page_id: return
@@ -518,7 +647,7 @@ class BlueprintEditor(QMainWindow):
         if not self.project: return
         fp,_ = QFileDialog.getOpenFileName(self,"选择图片","","图片 (*.png *.jpg *.jpeg *.bmp)")
         if not fp: return
-        page = self.project.import_image(fp)
+        page = self.project.import_image(fp, on_duplicate=self._dup_policy())
         self._after_target(page)
 
     def _after_target(self, page):
@@ -528,6 +657,7 @@ class BlueprintEditor(QMainWindow):
             self.prop._item.target_page = page.page_id
             self.prop._item.target_display = page.display_name
             self.prop._item.update_label_display()
+            self.canvas.mark_dirty()
             for i in range(self.prop.cb_target.count()):
                 if self.prop.cb_target.itemData(i) == page.page_id:
                     self.prop.cb_target.blockSignals(True)
@@ -538,10 +668,12 @@ class BlueprintEditor(QMainWindow):
 
     # ========== 辅助 ==========
 
-    def _refresh_box_displays(self):
-        """页面改名后，更新所有链接框上显示的目标名称"""
+    def _refresh_box_displays(self, renamed=None):
+        """页面改名后，更新链接框上显示的目标名称；给出 renamed 时只刷新指向它的框"""
         for item in self.canvas.box_items:
             if item.box_type == "link" and item.target_page:
+                if renamed and item.target_page != renamed:
+                    continue
                 if item.target_page in self.project.pages:
                     item.target_display = self.project.pages[item.target_page].display_name
                 else:
@@ -549,11 +681,14 @@ class BlueprintEditor(QMainWindow):
                 item.update_label_display()
 
     def _save_boxes(self):
+        """把当前页面画布上的框同步回模型（画布未修改时跳过）"""
         if not self.project or not self.current_page_id: return
+        if not self.canvas.dirty: return
         p = self.project.pages.get(self.current_page_id)
         if not p: return
         p.boxes = [Box(d["label"], d["points"], d["box_type"], d.get("target_page"))
                    for d in self.canvas.get_all_box_data()]
+        self.canvas.mark_clean()
 
     def _reload_list(self, reselect=None):
         self.page_list.blockSignals(True)
@@ -583,18 +718,24 @@ class BlueprintEditor(QMainWindow):
         super().keyPressEvent(ev)
 
     def closeEvent(self, ev):
+        if self._burst is not None:
+            self._burst.stop(); self._burst.wait()
+        if self._capture is not None:
+            self._capture.wait()
         if self.project:
             r = QMessageBox.question(self,"退出","保存后退出？",
                                      QMessageBox.Yes|QMessageBox.No|QMessageBox.Cancel)
             if r == QMessageBox.Yes: self._on_save()
             elif r == QMessageBox.Cancel: ev.ignore(); return
+        self._writer.close()
         super().closeEvent(ev)
 
 
 def main():
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
-    w = BlueprintEditor(app_name="幸福小渔村")
+    # 目标窗口标题；"replay:<目录>" 时用目录中的图片代替截屏
+    w = BlueprintEditor(app_name=sys.argv[1] if len(sys.argv) > 1 else "幸福小渔村")
     w.show()
     sys.exit(app.exec_())
 
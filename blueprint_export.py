@@ -3,16 +3,28 @@ blueprint_export.py
 从蓝图 project.json 导出为 tasks/ 目录结构，兼容 StateManager
 
 用法:
-    python blueprint_export.py <蓝图项目目录> [输出目录]
+    python blueprint_export.py <蓝图项目目录> [输出目录] [--incremental]
     python blueprint_export.py ./blueprint/程序1
     python blueprint_export.py ./blueprint/程序1 ./tasks
+    python blueprint_export.py ./blueprint/程序1 ./tasks --incremental
+    python blueprint_export.py ./blueprint/程序1 ./tasks --workers=8
+    python blueprint_export.py ./blueprint/程序1 ./tasks --images=hardlink
+    python blueprint_export.py ./blueprint/程序1 ./tasks --crop=4
+    python blueprint_export.py ./blueprint/程序1 ./tasks --hashes
+    python blueprint_export.py ./blueprint/程序1 ./tasks --bundle
 """
 
+import hashlib
 import json
+import math
+import os
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from blueprint_model import DB_NAME, read_image_size, read_project_data
+
 try:
     from PIL import Image as PILImage
     HAS_PIL = True
@@ -20,15 +32,47 @@ except ImportError:
     HAS_PIL = False
 
 
+SECTIONS = ("pop-states", "pop-change", "page-states", "page-change")
+MANIFEST_NAME = ".export_manifest.json"
+MANIFEST_VERSION = 1
+# 同一张源图片被多个产物使用时的存储方式
+#   copy     每个产物各复制一份（默认，与旧版一致）
+#   hardlink 只写一份，其余为硬链接（跨盘等失败时退回复制）
+#   symlink  只写一份，其余为相对符号链接（失败时退回复制）
+#   shared   只写一份，其余 json 的 imagePath 直接引用它，不再生成同名 png
+IMAGE_MODES = ("copy", "hardlink", "symlink", "shared")
+
+
 def get_image_size(path):
-    """获取图片宽高"""
-    if HAS_PIL:
-        try:
-            with PILImage.open(str(path)) as img:
-                return img.size   # (w, h)
-        except Exception:
-            pass
-    return 0, 0
+    """获取图片宽高（读文件头，不需要 PIL）"""
+    return read_image_size(path)
+
+
+def box_rect(points, img_w, img_h, margin=0):
+    """
+    框坐标 → 整数像素矩形 (x0, y0, x1, y1)，外扩 margin 并裁到图片范围内
+    左上取 floor、右下取 ceil，保证框内像素全部包含
+    零尺寸框或图片外的框得到空矩形 (x1 <= x0 或 y1 <= y0)，见 rect_empty
+    """
+    (ax, ay), (bx, by) = points
+    x0 = max(0, math.floor(min(ax, bx)) - margin)
+    y0 = max(0, math.floor(min(ay, by)) - margin)
+    x1 = math.ceil(max(ax, bx)) + margin
+    y1 = math.ceil(max(ay, by)) + margin
+    if img_w and img_h:
+        x0, y0 = min(x0, img_w), min(y0, img_h)
+        x1, y1 = min(x1, img_w), min(y1, img_h)
+    return x0, y0, x1, y1
+
+
+def rect_empty(rect):
+    x0, y0, x1, y1 = rect
+    return x1 <= x0 or y1 <= y0
+
+
+def union_rect(rects):
+    xs0, ys0, xs1, ys1 = zip(*rects)
+    return min(xs0), min(ys0), max(xs1), max(ys1)
 
 
 def sanitize_name(name):
@@ -40,25 +84,181 @@ def sanitize_name(name):
     return name.replace("_", "").replace(" ", "").strip()
 
 
-def export_blueprint(project_dir, output_dir=None):
+# ==================== 增量清单 ====================
+def _digest(*parts):
+    """对产物的全部输入取哈希，输入不变 → 哈希不变"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _source_stamp(path):
+    """源图片的 (大小, 修改时间)，只 stat 不读内容；不存在返回 None"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_manifest(output_dir):
+    """读取上次导出的清单，不存在或损坏时返回空清单"""
+    path = Path(output_dir) / MANIFEST_NAME
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "sources": {}, "files": {}}
+    if data.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "sources": {}, "files": {}}
+    data.setdefault("sources", {})
+    data.setdefault("files", {})
+    return data
+
+
+def save_manifest(output_dir, manifest):
+    path = Path(output_dir) / MANIFEST_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def _labelme(shapes, image_path, img_w, img_h, rect=None):
+    data = {
+        "version": "0.4.29",
+        "flags": {},
+        "shapes": shapes,
+        "imagePath": image_path,
+        "imageData": None,
+        "imageHeight": img_h,
+        "imageWidth": img_w,
+    }
+    if rect is not None:
+        x0, y0, x1, y1 = rect
+        data["templateOffset"] = [x0, y0]
+        data["templateSize"] = [x1 - x0, y1 - y0]
+    return data
+
+
+def _shape(label, points):
+    return {
+        "label": label,
+        "text": "",
+        "points": points,
+        "group_id": None,
+        "shape_type": "rectangle",
+        "flags": {}
+    }
+
+
+def _unlink(path):
+    """先断开旧文件，避免写穿上次导出留下的硬链接 / 符号链接"""
+    if os.path.lexists(path):
+        path.unlink()
+
+
+def _write_artifact(output_dir, rel, art):
+    dst = output_dir / rel
+    if art["kind"] == "copy":
+        _unlink(dst)
+        shutil.copy2(art["src"], dst)
+        print(f"  📷 {art['src'].name} → {rel}")
+    elif art["kind"] == "crop":
+        _unlink(dst)
+        with PILImage.open(str(art["src"])) as img:
+            img.crop(art["rect"]).save(str(dst), "PNG")
+        print(f"  ✂ {art['src'].name} {art['rect']} → {rel}")
+    elif art["kind"] in ("hardlink", "symlink"):
+        _unlink(dst)
+        target = output_dir / art["target"]
+        try:
+            if art["kind"] == "hardlink":
+                os.link(target, dst)
+            else:
+                os.symlink(os.path.relpath(target, dst.parent), dst)
+            print(f"  🔗 {art['target']} → {rel}")
+        except OSError:
+            shutil.copy2(art["src"], dst)
+            print(f"  📷 {art['src'].name} → {rel}")
+    elif art["kind"] == "json":
+        with open(dst, "w", encoding="utf-8") as f:
+            json.dump(art["data"], f, ensure_ascii=False, indent=2)
+    else:   # text
+        with open(dst, "w", encoding="utf-8") as f:
+            f.write(art["text"])
+
+
+def _resolve_workers(workers):
+    """None / 0 → 按 CPU 数；1 → 顺序执行"""
+    if not workers or workers < 0:
+        return min(32, (os.cpu_count() or 1) + 4)
+    return workers
+
+
+def _run(pool, fn, items):
+    """有线程池就并行，否则顺序；结果与 items 顺序一致"""
+    if pool is None:
+        return [fn(it) for it in items]
+    return list(pool.map(fn, items))
+
+
+def export_blueprint(project_dir, output_dir=None, incremental=False, workers=1,
+                     image_mode="copy", crop_margin=None, roi_hashes=False, bundle=False):
     """
-    读取蓝图 project.json，导出：
+    读取蓝图 project.json（或 sqlite 后端的 project.db），导出：
       tasks/
         pop-states/     弹出页面 身份图片 + json
         pop-change/     弹出页面 链接 json
         page-states/    普通页面 身份图片 + json
         page-change/    普通页面 链接 json
         states.txt      配置文件
+        .export_manifest.json   增量清单（每个产物的输入哈希）
+
+    incremental=True 时只重写输入发生变化的文件：源图片按 (大小, 修改时间)
+    判断，json 按框坐标 / 名称判断；清单中有而本次不再产出的文件会被删除
+    （如移除链接后残留的 page-change 文件）。
+
+    workers > 1 时，图片尺寸探测、图片复制、json 序列化放到线程池并行执行
+    （导出以磁盘 I/O 和图片头解析为主，线程即可吃满磁盘队列）；
+    workers=None 按 CPU 数自动选择。产物清单与 states.txt 仍按 page_order
+    顺序生成，输出与顺序导出完全一致。
+
+    image_mode 控制同一截图被多个产物（身份图 + 每个链接框）使用时的存储方式，
+    见 IMAGE_MODES。hardlink / symlink 保持 StateManager 的文件命名不变；
+    shared 不再生成重复 png，要求运行端按 LabelMe 的 imagePath 读图。
+
+    crop_margin 不为 None 时（需要 PIL），模板图片只保存框内像素（外扩
+    crop_margin 像素）：states 图为全部身份框的外接矩形，change 图为单个链接框。
+    json 中 shapes 坐标、imageWidth / imageHeight 仍是原截图坐标系，另加
+    templateOffset=[x, y]（裁剪图左上角在原图中的位置）和 templateSize=[w, h]。
+
+    roi_hashes=True 时（需要 NumPy）states json 另加 roiHashes: 每个身份框的
+    整数矩形和框内灰度像素的精确 / 量化哈希（见 blueprint_detect.roi_digests），
+    供识别端查表。哈希按源图片 (大小, 修改时间) 缓存在清单里，图片不变不重算。
+
+    bundle=True 时（需要 NumPy）另写 templates.bundle: 全部模板灰度像素 + 索引的
+    单文件模板包，运行端 mmap 即用（见 blueprint_bundle）。增量导出时只在有文件
+    变化或包不存在时重写。
     """
+    if image_mode not in IMAGE_MODES:
+        print(f"❌ 未知图片模式: {image_mode}，可选: {', '.join(IMAGE_MODES)}")
+        return False
+    if crop_margin is not None and not HAS_PIL:
+        print("⚠️ 裁剪模板需要 PIL (pip install pillow)，改为导出整张截图")
+        crop_margin = None
+    if roi_hashes or bundle:
+        from blueprint_detect import HAS_NUMPY
+        if not HAS_NUMPY:
+            print("⚠️ 身份框哈希 / 模板包需要 NumPy (pip install numpy)，不生成")
+            roi_hashes = bundle = False
     project_dir = Path(project_dir).resolve()
     config_path = project_dir / "project.json"
 
-    if not config_path.exists():
+    if not config_path.exists() and not (project_dir / DB_NAME).exists():
         print(f"❌ 找不到: {config_path}")
         return False
 
-    with open(config_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data, _ = read_project_data(project_dir)     # 含未压缩的保存日志
 
     if output_dir is None:
         output_dir = project_dir.parent / "tasks"
@@ -66,12 +266,51 @@ def export_blueprint(project_dir, output_dir=None):
         output_dir = Path(output_dir).resolve()
 
     # ---------- 创建目录 ----------
-    for d in ("pop-states", "pop-change", "page-states", "page-change"):
+    for d in SECTIONS:
         (output_dir / d).mkdir(parents=True, exist_ok=True)
 
+    old_manifest = load_manifest(output_dir)
+
     pages = data.get("pages", {})
     page_order = data.get("page_order", list(pages.keys()))
 
+    workers = _resolve_workers(workers)
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        return _export(project_dir, output_dir, pages, page_order, old_manifest, incremental,
+                       pool, image_mode, crop_margin, roi_hashes, bundle)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def _crop_rect(rect, name):
+    """裁剪矩形为空（零尺寸框 / 框在图片外）时退回整图复制，返回 None"""
+    if rect_empty(rect):
+        print(f"⚠️ {name}: 框为空或在图片外 {rect}，改为复制整图")
+        return None
+    return rect
+
+
+def _roi_hashes(src_img, rects):
+    """源图片中各矩形的 {"x0,y0,x1,y1": [精确, 量化]}；读图失败返回 {}"""
+    from blueprint_detect import read_gray, roi_digests
+    gray = read_gray(src_img)
+    if gray is None:
+        return {}
+    out = {}
+    for rect in rects:
+        d = roi_digests(gray, rect)
+        if d is not None:
+            out[",".join(map(str, rect))] = list(d)
+    return out
+
+
+def _export(project_dir, output_dir, pages, page_order, old_manifest, incremental, pool,
+            image_mode, crop_margin, roi_hashes, bundle):
+    old_sources = old_manifest["sources"]
+    new_sources = {}
+
     # ---------- page_id → 安全英文名 ----------
     id_to_en = {}
     used_names = set()
@@ -90,13 +329,85 @@ def export_blueprint(project_dir, output_dir=None):
         used_names.add(en)
         id_to_en[pid] = en
 
+    # ---------- 源图片尺寸 (清单缓存未命中的并行探测) ----------
+    image_rels = list(dict.fromkeys(pages[pid].get("image", "") for pid in page_order))
+    stamps = dict(zip(image_rels, _run(pool, lambda rel: _source_stamp(project_dir / rel),
+                                       image_rels)))
+    infos = {}
+    for pid in page_order:
+        info = pages[pid].get("image_info")
+        if info:
+            infos[pages[pid].get("image", "")] = info
+    sizes = {}
+    to_probe = []
+    for rel in image_rels:
+        cached = old_sources.get(rel)
+        info = infos.get(rel)
+        stamp = stamps[rel]
+        if stamp and info and info.get("size") == stamp[0] and info.get("mtime") == stamp[1]:
+            sizes[rel] = (info["width"], info["height"])     # project.json 已记录
+        elif cached and stamp and cached.get("stamp") == stamp:
+            sizes[rel] = tuple(cached["size"])
+        else:
+            to_probe.append(rel)
+    sizes.update(zip(to_probe, _run(pool, lambda rel: get_image_size(project_dir / rel),
+                                    to_probe)))
+    for rel in image_rels:
+        if stamps[rel]:
+            new_sources[rel] = {"stamp": stamps[rel], "size": list(sizes[rel])}
+
+    # ---------- 身份框哈希 (清单缓存未命中的并行读图计算) ----------
+    hashes = {}         # 源图片 → {"x0,y0,x1,y1": [精确, 量化]}
+    if roi_hashes:
+        need = {}
+        for pid in page_order:
+            rel = pages[pid].get("image", "")
+            w, h = sizes[rel]
+            for b in pages[pid].get("boxes", []):
+                if b.get("box_type") == "identity":
+                    need.setdefault(rel, set()).add(box_rect(b["points"], w, h))
+        to_hash = []
+        for rel, rects in need.items():
+            cached = old_sources.get(rel)
+            if not stamps[rel]:
+                continue
+            if cached and cached.get("stamp") == stamps[rel] and all(
+                    ",".join(map(str, r)) in cached.get("roi", {}) for r in rects):
+                hashes[rel] = cached["roi"]
+            else:
+                to_hash.append(rel)
+        hashes.update(zip(to_hash, _run(pool, lambda rel: _roi_hashes(project_dir / rel,
+                                                                     sorted(need[rel])),
+                                        to_hash)))
+        for rel, roi in hashes.items():
+            new_sources[rel]["roi"] = roi
+
     # ---------- 收集 txt 各节内容 ----------
-    txt = {
-        "pop-states":  [],
-        "pop-change":  [],
-        "page-states": [],
-        "page-change": [],
-    }
+    txt = {section: [] for section in SECTIONS}
+
+    # ---------- 产物: 相对路径 → (类型, 输入) ----------
+    artifacts = {}
+    canonical = {}      # (源图片, 裁剪矩形) → 第一个使用它的图片产物
+
+    def add_image(rel, image_rel, src_img, stamp, rect=None):
+        """登记图片产物，返回 json 里 imagePath 应填的路径"""
+        name = rel.rsplit("/", 1)[-1]
+        if not stamp:
+            return name
+        digest = _digest(image_rel, stamp, rect)
+        first = canonical.setdefault((image_rel, rect), rel)
+        if first == rel or image_mode == "copy":
+            if rect is None:
+                artifacts[rel] = {"kind": "copy", "src": src_img, "digest": digest}
+            else:
+                artifacts[rel] = {"kind": "crop", "src": src_img, "rect": rect,
+                                  "digest": digest}
+        elif image_mode == "shared":
+            return os.path.relpath(first, rel.rsplit("/", 1)[0]).replace(os.sep, "/")
+        else:
+            artifacts[rel] = {"kind": image_mode, "src": src_img, "target": first,
+                              "digest": _digest(image_mode, first, digest)}
+        return name
 
     for pid in page_order:
         p = pages[pid]
@@ -108,43 +419,40 @@ def export_blueprint(project_dir, output_dir=None):
 
         prefix = "pop" if is_popup else "page"
         src_img = project_dir / image_rel
-        img_w, img_h = get_image_size(src_img)
+        stamp = stamps[image_rel]
+        img_w, img_h = sizes[image_rel]
 
         # ====== 身份框 → states ======
         identity_boxes = [b for b in boxes if b.get("box_type") == "identity"]
         if identity_boxes:
             states_dir = f"{prefix}-states"
 
+            rect = None
+            if crop_margin is not None:
+                rect = _crop_rect(union_rect([box_rect(b["points"], img_w, img_h, crop_margin)
+                                              for b in identity_boxes]), f"{states_dir}/{en_name}")
+
             # 复制图片
-            dst_img = output_dir / states_dir / f"{en_name}.png"
-            if src_img.exists():
-                shutil.copy2(src_img, dst_img)
-                print(f"  📷 {src_img.name} → {states_dir}/{en_name}.png")
+            image_path = add_image(f"{states_dir}/{en_name}.png", image_rel, src_img,
+                                   stamp, rect)
 
             # 生成 LabelMe JSON（所有身份框合在一个 json）
-            shapes = []
-            for b in identity_boxes:
-                shapes.append({
-                    "label": "state",
-                     "text": "", 
-                    "points": b["points"],
-                    "group_id": None,
-                    "shape_type": "rectangle",
-                    "flags": {}
-                })
-
-            labelme = {
-                "version": "0.4.29",
-                "flags": {},
-                "shapes": shapes,
-                "imagePath": f"{en_name}.png",
-                "imageData": None,
-                "imageHeight": img_h,
-                "imageWidth": img_w,
+            shapes = [_shape("state", b["points"]) for b in identity_boxes]
+            labelme = _labelme(shapes, image_path, img_w, img_h, rect)
+            if roi_hashes:
+                roi = hashes.get(image_rel, {})
+                entries = []
+                for b in identity_boxes:
+                    r = box_rect(b["points"], img_w, img_h)
+                    d = roi.get(",".join(map(str, r)))
+                    if d is None:
+                        break
+                    entries.append({"rect": list(r), "exact": d[0], "quant": d[1]})
+                else:
+                    labelme["roiHashes"] = entries
+            artifacts[f"{states_dir}/{en_name}.json"] = {
+                "kind": "json", "data": labelme, "digest": _digest(labelme),
             }
-            json_path = output_dir / states_dir / f"{en_name}.json"
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(labelme, f, ensure_ascii=False, indent=2)
 
             # txt 行
             comment = f" #{cn_name}" if cn_name else ""
@@ -175,48 +483,74 @@ def export_blueprint(project_dir, output_dir=None):
                 seq = f"{idx:02d}"
                 change_name = f"{en_name}_{target_en}_{seq}"
 
+                rect = None
+                if crop_margin is not None:
+                    rect = _crop_rect(box_rect(b["points"], img_w, img_h, crop_margin),
+                                      f"{change_dir}/{change_name}")
+
                 # 复制图片，文件名与 json 一致
-                dst_change_img = output_dir / change_dir / f"{change_name}.png"
-                if src_img.exists():
-                    shutil.copy2(src_img, dst_change_img)
-                    print(f"  📷 {src_img.name} → {change_dir}/{change_name}.png")
-
-                labelme = {
-                    "version": "0.4.29",
-                    "flags": {},
-                    "shapes": [
-                        {
-                            "label": b.get("label", change_name),
-                            "text": "",
-                            "points": b["points"],
-                            "group_id": None,
-                            "shape_type": "rectangle",
-                            "flags": {}
-                        }
-                    ],
-                    "imagePath": f"{change_name}.png",
-                    "imageData": None,
-                    "imageHeight": img_h,
-                    "imageWidth": img_w,
+                image_path = add_image(f"{change_dir}/{change_name}.png",
+                                       image_rel, src_img, stamp, rect)
+
+                shapes = [_shape(b.get("label", change_name), b["points"])]
+                labelme = _labelme(shapes, image_path, img_w, img_h, rect)
+                artifacts[f"{change_dir}/{change_name}.json"] = {
+                    "kind": "json", "data": labelme, "digest": _digest(labelme),
                 }
-                json_path = output_dir / change_dir / f"{change_name}.json"
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(labelme, f, ensure_ascii=False, indent=2)
 
                 txt[change_dir].append(
                     f'{change_name} = "tasks/{change_dir}/{change_name}"'
                 )
-                
+
     # ====== 生成 states.txt ======
-    txt_path = output_dir / "states.txt"
-    with open(txt_path, "w", encoding="utf-8") as f:
-        for section in ("pop-states", "pop-change", "page-states", "page-change"):
-            f.write(f"#{section}\n")
-            for line in txt[section]:
-                f.write(f"{line}\n")
-            f.write("\n")
+    lines = []
+    for section in SECTIONS:
+        lines.append(f"#{section}\n")
+        lines.extend(f"{line}\n" for line in txt[section])
+        lines.append("\n")
+    states_text = "".join(lines)
+    artifacts["states.txt"] = {
+        "kind": "text", "text": states_text, "digest": _digest(states_text),
+    }
+
+    # ====== 写出 (增量模式跳过未变化的文件) ======
+    old_files = old_manifest["files"]
+    pending = [rel for rel, art in artifacts.items()
+               if not (incremental and old_files.get(rel) == art["digest"]
+                       and (output_dir / rel).exists())]
+    # 链接类产物依赖其目标文件，放到第二轮
+    linked = ("hardlink", "symlink")
+    first_pass = [rel for rel in pending if artifacts[rel]["kind"] not in linked]
+    second_pass = [rel for rel in pending if artifacts[rel]["kind"] in linked]
+    for batch in (first_pass, second_pass):
+        _run(pool, lambda rel: _write_artifact(output_dir, rel, artifacts[rel]), batch)
+    written = len(pending)
+    skipped = len(artifacts) - written
+
+    # ====== 清理上次导出、本次不再产出的文件 ======
+    removed = 0
+    for rel in old_files:
+        if rel not in artifacts:
+            stale = output_dir / rel
+            if os.path.lexists(stale):
+                stale.unlink()
+                print(f"  🗑 {rel}")
+                removed += 1
+
+    save_manifest(output_dir, {
+        "version": MANIFEST_VERSION,
+        "sources": new_sources,
+        "files": {rel: art["digest"] for rel, art in artifacts.items()},
+    })
+
+    # ====== 模板包 ======
+    if bundle:
+        from blueprint_bundle import BUNDLE_NAME, write_bundle
+        if written or removed or not (output_dir / BUNDLE_NAME).exists():
+            write_bundle(output_dir)
 
     # ====== 统计 ======
+    txt_path = output_dir / "states.txt"
     print(f"\n✅ 导出完成 → {output_dir}")
     print(f"   states.txt: {txt_path}")
     total = 0
@@ -225,21 +559,42 @@ def export_blueprint(project_dir, output_dir=None):
             print(f"   {section}: {len(lines)} 条")
             total += len(lines)
     print(f"   共计: {total} 条")
+    print(f"   写入 {written} 个文件，跳过 {skipped} 个，删除 {removed} 个")
     return True
 
 
 # ==================== 入口 ====================
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    flags = {a for a in sys.argv[1:] if a.startswith("--")}
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 1:
         print("用法:")
         print("  python blueprint_export.py <蓝图项目目录>")
         print("  python blueprint_export.py <蓝图项目目录> <输出目录>")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --incremental")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --workers=8")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --images=hardlink")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --crop=4")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --hashes")
+        print("  python blueprint_export.py <蓝图项目目录> <输出目录> --bundle")
         print()
         print("例:")
         print("  python blueprint_export.py ./blueprint/幸福小渔村")
         print("  python blueprint_export.py ./blueprint/幸福小渔村 ./tasks")
         sys.exit(1)
     # python blueprint_export.py XYC2 ./XYC2
-    proj = sys.argv[1]
-    out = sys.argv[2] if len(sys.argv) > 2 else None
-    export_blueprint(proj, out)
\ No newline at end of file
+    proj = args[0]
+    out = args[1] if len(args) > 1 else None
+    workers = 1
+    image_mode = "copy"
+    crop_margin = None
+    for a in flags:
+        if a.startswith("--workers="):
+            workers = int(a.split("=", 1)[1])
+        elif a.startswith("--images="):
+            image_mode = a.split("=", 1)[1]
+        elif a.startswith("--crop="):
+            crop_margin = int(a.split("=", 1)[1])
+    export_blueprint(proj, out, incremental="--incremental" in flags, workers=workers,
+                     image_mode=image_mode, crop_margin=crop_margin,
+                     roi_hashes="--hashes" in flags, bundle="--bundle" in flags)
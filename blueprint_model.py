@@ -1,20 +1,140 @@
 """
 蓝图数据模型 - 持久化 + 页面/框管理
 """
+import glob
+import hashlib
 import json
+import os
 import shutil
+import struct
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from blueprint_phash import (
+    DUP_SIMILARITY, PHashIndex, dhash_file, dhash_image, similarity_to_distance,
+)
+from blueprint_sqlite import DB_NAME, SqliteStore
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+# ==================== 图片信息 ====================
+def read_image_size(path):
+    """
+    只读文件头获取图片宽高 (PNG / JPEG / BMP / GIF)，不解码像素
+    其他格式交给 PIL；都失败返回 (0, 0)
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"BM") and len(head) >= 26:
+                w, h = struct.unpack("<ii", head[18:26])
+                return w, abs(h)
+            if head.startswith(b"\xff\xd8"):
+                f.seek(2)
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xFF:
+                        break
+                    code = marker[1]
+                    if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+                        continue
+                    seg_len = struct.unpack(">H", f.read(2))[0]
+                    if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                        h, w = struct.unpack(">xHH", f.read(5))
+                        return w, h
+                    f.seek(seg_len - 2, 1)
+    except (OSError, struct.error):
+        return 0, 0
+    try:
+        from PIL import Image as PILImage
+        with PILImage.open(str(path)) as img:
+            return img.size
+    except Exception:
+        return 0, 0
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def probe_image(path, phash=None):
+    """
+    图片元信息: 宽高 / 文件大小 / 修改时间 / 内容哈希 / 感知哈希 (dHash, 16 位十六进制)
+    已算好感知哈希时传入 phash，不再解码。文件不存在返回 None
+    """
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    w, h = read_image_size(path)
+    info = {
+        "width": w,
+        "height": h,
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+        "hash": file_hash(path),
+    }
+    ph = dhash_file(path) if phash is None else phash
+    if ph is not None:
+        info["phash"] = f"{ph:016x}"
+    return info
+
+
+def image_info_valid(info, path):
+    """记录的 (大小, 修改时间) 与文件一致即视为有效，不读内容"""
+    if not info:
+        return False
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return False
+    return info.get("size") == st.st_size and info.get("mtime") == st.st_mtime_ns
+
 
 class Box:
+    __slots__ = ("label", "_xy", "box_type", "target_page")
+
     def __init__(self, label="", points=None, box_type="identity", target_page=None):
         self.label = label
         self.points = points or [[0, 0], [0, 0]]
         self.box_type = box_type          # "identity" | "link"
         self.target_page = target_page    # 仅 link 使用
 
+    # 坐标以 4 个 double 紧凑存放。读出的是只读副本 ((x1, y1), (x2, y2))，
+    # 修改坐标要整体赋值: box.points = [[x1, y1], [x2, y2]]
+    @property
+    def points(self):
+        xy = self._xy
+        return (xy[0], xy[1]), (xy[2], xy[3])
+
+    @points.setter
+    def points(self, value):
+        (x1, y1), (x2, y2) = value
+        self._xy = array("d", (x1, y1, x2, y2))
+
     def to_dict(self):
-        d = {"label": self.label, "points": self.points, "box_type": self.box_type}
+        xy = self._xy
+        d = {"label": self.label, "points": [[xy[0], xy[1]], [xy[2], xy[3]]],
+             "box_type": self.box_type}
         if self.box_type == "link":
             d["target_page"] = self.target_page
         return d
@@ -30,44 +150,420 @@ class Box:
 
 
 class Page:
+    __slots__ = ("page_id", "name_cn", "name_en", "is_popup", "image_path", "image_info",
+                 "_boxes", "_raw_boxes", "_owner")
+    _TRACKED = frozenset(("name_cn", "name_en", "is_popup", "image_path", "image_info"))
+
     def __init__(self, page_id, name_cn="", name_en="", is_popup=False, image_path=""):
+        self._owner = None                # 所属项目: 维护框缓存 / 链接索引 / 脏页
         self.page_id = page_id
         self.name_cn = name_cn
         self.name_en = name_en
         self.is_popup = is_popup
         self.image_path = image_path
-        self.boxes = []
+        self.image_info = None            # probe_image() 结果，见 BlueprintProject.image_info
+        self._boxes = []
+        self._raw_boxes = None            # 懒加载: 尚未实例化的框 dict 列表
+
+    def __setattr__(self, name, value):
+        # 元信息赋了不同的值才记为脏页
+        if name in Page._TRACKED and self._owner is not None \
+                and getattr(self, name) != value:
+            self._owner.mark_dirty(self.page_id)
+        object.__setattr__(self, name, value)
 
     @property
     def display_name(self):
         return self.name_cn or self.name_en or self.page_id
 
+    # ----- 框 (懒加载时首次访问才实例化) -----
+    @property
+    def boxes(self):
+        """交出的是可原地修改的列表，所以取用即记为可能修改（保存时再比较）"""
+        if self._boxes is None:
+            self._boxes = [Box.from_dict(b) for b in self._raw_boxes]
+            self._raw_boxes = None
+        if self._owner is not None:
+            self._owner._touch_page(self)
+            self._owner.mark_dirty(self.page_id)
+        return self._boxes
+
+    @boxes.setter
+    def boxes(self, value):
+        if self._owner is not None:
+            self._owner.mark_dirty(self.page_id)
+        self._boxes = value
+        self._raw_boxes = None
+        if self._owner is not None:
+            self._owner._touch_page(self)
+            self._owner.reindex_links(self.page_id)
+
+    @property
+    def boxes_loaded(self):
+        return self._boxes is not None
+
+    def raw_boxes(self):
+        """框的 dict 形式；未实例化时直接返回原始数据，不触发加载"""
+        if self._boxes is None:
+            return self._raw_boxes
+        return [b.to_dict() for b in self._boxes]
+
+    def link_targets(self):
+        """所有链接框的 target_page（可能为 None），不触发加载"""
+        if self._boxes is None:
+            return [b.get("target_page") for b in self._raw_boxes
+                    if b.get("box_type") == "link"]
+        return [b.target_page for b in self._boxes if b.box_type == "link"]
+
+    def unload_boxes(self):
+        """把已实例化的框退回 dict 形式（修改不会丢失）"""
+        if self._boxes is not None:
+            self._raw_boxes = [b.to_dict() for b in self._boxes]
+            self._boxes = None
+
     def to_dict(self):
-        return {
+        d = {
             "name_cn": self.name_cn,
             "name_en": self.name_en,
             "is_popup": self.is_popup,
             "image": self.image_path,
-            "boxes": [b.to_dict() for b in self.boxes],
+            "boxes": self.raw_boxes(),
         }
+        if self.image_info:
+            d["image_info"] = self.image_info
+        return d
 
     @classmethod
-    def from_dict(cls, page_id, data):
+    def from_dict(cls, page_id, data, lazy=False):
         p = cls(page_id,
                 name_cn=data.get("name_cn", ""),
                 name_en=data.get("name_en", ""),
                 is_popup=data.get("is_popup", False),
                 image_path=data.get("image", ""))
-        p.boxes = [Box.from_dict(b) for b in data.get("boxes", [])]
+        p.image_info = data.get("image_info")
+        if lazy:
+            p._boxes = None
+            p._raw_boxes = data.get("boxes", [])
+        else:
+            p._boxes = [Box.from_dict(b) for b in data.get("boxes", [])]
         return p
 
 
+# ==================== 日志式保存 ====================
+JOURNAL_NAME = "project.journal"
+
+
+def _page_json(page_dict):
+    return json.dumps(page_dict, ensure_ascii=False, sort_keys=True)
+
+
+def _mtime(*paths):
+    return max((p.stat().st_mtime_ns for p in paths if p.exists()), default=0)
+
+
+def detect_backend(project_dir):
+    """
+    只有 project.json 用 json，只有 project.db 用 sqlite
+    两者都在（旧版转换留下的）时取最近写过的那个: json 看快照和日志，sqlite 看库和 WAL
+    """
+    project_dir = Path(project_dir)
+    db = project_dir / DB_NAME
+    if not db.exists():
+        return "json"
+    config = project_dir / "project.json"
+    if not config.exists():
+        return "sqlite"
+    json_mtime = _mtime(config, project_dir / JOURNAL_NAME)
+    db_mtime = _mtime(db, db.with_name(db.name + "-wal"))
+    return "sqlite" if db_mtime > json_mtime else "json"
+
+
+def read_project_data(project_dir, backend=None):
+    """
+    读取 project.json 快照，并重放同代 (generation) 的 project.journal 尾部
+    返回 (data, 重放条数)；无法解析的行（崩溃时写了一半）跳过，其后的行照常重放
+    sqlite 后端直接从 project.db 读出同结构的 dict
+    """
+    data, replayed, _ = _read_project(project_dir, backend)
+    return data, replayed
+
+
+def _read_project(project_dir, backend=None):
+    """同 read_project_data，另返回日志中跳过的坏行数"""
+    project_dir = Path(project_dir)
+    if (backend or detect_backend(project_dir)) == "sqlite":
+        store = SqliteStore(project_dir / DB_NAME, readonly=True)
+        try:
+            return store.read_data(), 0, 0
+        finally:
+            store.close()
+    with open(project_dir / "project.json", "r", encoding="utf-8") as f:
+        data = json.load(f)
+    gen = data.get("generation", 0)
+    data.setdefault("page_order", [])
+    data.setdefault("pages", {})
+    replayed = bad = 0
+    try:
+        f = open(project_dir / JOURNAL_NAME, "r", encoding="utf-8", errors="replace")
+    except OSError:
+        return data, replayed, bad
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                bad += 1                    # 崩溃时未写完的行
+                continue
+            if not isinstance(entry, dict) or entry.get("gen") != gen:
+                continue                    # 属于已压缩的旧快照
+            op = entry.get("op")
+            if op == "page":
+                data["pages"][entry["id"]] = entry["data"]
+            elif op == "del":
+                data["pages"].pop(entry["id"], None)
+            elif op == "meta":
+                data["project_name"] = entry["project_name"]
+                data["page_order"] = entry["page_order"]
+            replayed += 1
+    return data, replayed, bad
+
+
+def _retire(*paths):
+    """转换后把原存储改名为 .bak 留作备份，目录里只剩一种存储"""
+    for p in paths:
+        if p.exists():
+            os.replace(p, p.with_name(p.name + ".bak"))
+
+
+def convert_project(project_dir, backend):
+    """
+    在 json / sqlite 两种存储之间转换: 从另一种存储完整读出，全量写入 backend，
+    原存储文件改名为 *.bak。原存储不存在返回 None
+    """
+    project_dir = Path(project_dir)
+    source = "json" if backend == "sqlite" else "sqlite"
+    db = project_dir / DB_NAME
+    src_file = project_dir / ("project.json" if source == "json" else DB_NAME)
+    if not src_file.exists():
+        print(f"❌ 找不到 {src_file}")
+        return None
+    proj = BlueprintProject.load(project_dir, backend=source)
+    proj.backend = backend
+    if backend == "sqlite":
+        # 清空后重写: 目标库里可能有上次转换留下、现已删除的页面
+        proj.store.write(proj.name, proj._page_order, proj._page_dicts(), replace=True)
+        proj.close()
+        _retire(proj.config_path, proj.journal_path)
+    else:
+        proj._write_snapshot()
+        proj.close()
+        # 只读打开不会合并 WAL: 用一个可写连接打开再关闭，WAL 并回库文件后再改名
+        SqliteStore(db).close()
+        _retire(db, db.with_name(db.name + "-wal"), db.with_name(db.name + "-shm"))
+    return proj
+
+
+# ==================== 列式框表 ====================
+BOX_TYPES = ("identity", "link")
+
+
+class BoxTable:
+    """
+    全项目框的列式快照: 每个框一行，按 page_order 顺序连续存放
+      page    所在页面下标        kind    0=identity 1=link
+      x0..y1  归一化后的矩形      target  目标页面下标，无则 -1
+    有 numpy 时各列为 ndarray，可做批量命中 / 缩放 / 重叠检测；否则为 array。
+    由 BlueprintProject.box_table() 构建，懒加载未实例化的页面直接读原始 dict，不会触发加载。
+
+    这是构建时刻的副本，与模型互不联动:
+      - 构建后对模型的修改（增删框、改坐标）不会反映到表里，需重新 box_table()
+      - 直接改列不会影响模型，需 write_back(page_id) 写回（rescale 已自动写回）；
+        该页面的框数与构建时不同时拒绝写回
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.page_ids = list(project._page_order)
+        index = {pid: i for i, pid in enumerate(self.page_ids)}
+        self.offsets = array("l", [0])     # 第 i 页的行范围 offsets[i]:offsets[i+1]
+        page, kind, target = array("l"), array("b"), array("l")
+        x0, y0, x1, y1 = array("d"), array("d"), array("d"), array("d")
+        labels = []
+        for i, pid in enumerate(self.page_ids):
+            for b in project.pages[pid].raw_boxes():
+                (ax, ay), (bx, by) = b.get("points", [[0, 0], [0, 0]])
+                page.append(i)
+                kind.append(BOX_TYPES.index(b.get("box_type", "identity")))
+                target.append(index.get(b.get("target_page"), -1))
+                x0.append(min(ax, bx)); y0.append(min(ay, by))
+                x1.append(max(ax, bx)); y1.append(max(ay, by))
+                labels.append(b.get("label", ""))
+            self.offsets.append(len(page))
+        self.labels = labels
+        self._index = index
+        cols = (page, kind, target, x0, y0, x1, y1)
+        if HAS_NUMPY:
+            cols = tuple(np.frombuffer(c, dtype=c.typecode) if len(c) else
+                         np.zeros(0, dtype=c.typecode) for c in cols)
+            cols = tuple(c.copy() for c in cols)
+        self.page, self.kind, self.target, self.x0, self.y0, self.x1, self.y1 = cols
+
+    def __len__(self):
+        return len(self.labels)
+
+    def rows(self, page_id):
+        i = self._index[page_id]
+        return range(self.offsets[i], self.offsets[i + 1])
+
+    def box(self, row):
+        """第 row 行对应的 Box（轻量副本）"""
+        target = self.target[row]
+        return Box(self.labels[row],
+                   [[float(self.x0[row]), float(self.y0[row])],
+                    [float(self.x1[row]), float(self.y1[row])]],
+                   BOX_TYPES[self.kind[row]],
+                   self.page_ids[target] if target >= 0 else None)
+
+    # ---------- 查询 ----------
+    def hit_test(self, page_id, x, y):
+        """包含点 (x, y) 的行，上层（后画的）在前"""
+        r = self.rows(page_id)
+        if HAS_NUMPY:
+            s = slice(r.start, r.stop)
+            hit = ((self.x0[s] <= x) & (x <= self.x1[s]) &
+                   (self.y0[s] <= y) & (y <= self.y1[s]))
+            return [int(i) + r.start for i in np.flatnonzero(hit)[::-1]]
+        return [i for i in reversed(r)
+                if self.x0[i] <= x <= self.x1[i] and self.y0[i] <= y <= self.y1[i]]
+
+    def overlaps(self, page_id):
+        """同一页面内互相重叠的行对 [(i, j), ...]，i < j"""
+        r = self.rows(page_id)
+        if HAS_NUMPY:
+            s = slice(r.start, r.stop)
+            x0, y0, x1, y1 = self.x0[s], self.y0[s], self.x1[s], self.y1[s]
+            hit = ((x0[:, None] < x1[None, :]) & (x0[None, :] < x1[:, None]) &
+                   (y0[:, None] < y1[None, :]) & (y0[None, :] < y1[:, None]))
+            ii, jj = np.nonzero(np.triu(hit, 1))
+            return [(int(i) + r.start, int(j) + r.start) for i, j in zip(ii, jj)]
+        return [(i, j) for i in r for j in range(i + 1, r.stop)
+                if self.x0[i] < self.x1[j] and self.x0[j] < self.x1[i]
+                and self.y0[i] < self.y1[j] and self.y0[j] < self.y1[i]]
+
+    def links_to(self, page_id):
+        """指向 page_id 的所有链接框行"""
+        t = self._index[page_id]
+        if HAS_NUMPY:
+            return [int(i) for i in np.flatnonzero(self.target == t)]
+        return [i for i, v in enumerate(self.target) if v == t]
+
+    # ---------- 批量修改 ----------
+    def rescale(self, sx, sy, page_ids=None):
+        """按比例缩放坐标（如截图分辨率变化），并写回模型"""
+        targets = page_ids if page_ids is not None else self.page_ids
+        for pid in targets:
+            r = self.rows(pid)
+            if HAS_NUMPY:
+                s = slice(r.start, r.stop)
+                self.x0[s] *= sx; self.x1[s] *= sx
+                self.y0[s] *= sy; self.y1[s] *= sy
+            else:
+                for i in r:
+                    self.x0[i] *= sx; self.x1[i] *= sx
+                    self.y0[i] *= sy; self.y1[i] *= sy
+            self.write_back(pid)
+
+    def write_back(self, page_id):
+        """
+        把该页面各行的坐标写回 Box（已实例化）或原始 dict（未实例化）
+        页面已删除或框数已变（表已过期）时不写，返回 False
+        """
+        page = self.project.pages.get(page_id)
+        rows = self.rows(page_id)
+        items = None if page is None else page._boxes if page.boxes_loaded else page._raw_boxes
+        if items is None or len(items) != len(rows):
+            print(f"⚠️ 框表已过期，未写回 {page_id}: 请重新 box_table()")
+            return False
+        self.project.mark_dirty(page_id)
+        for item, i in zip(items, rows):
+            pts = [[float(self.x0[i]), float(self.y0[i])],
+                   [float(self.x1[i]), float(self.y1[i])]]
+            if isinstance(item, Box):
+                item.points = pts
+            else:
+                item["points"] = pts
+        return True
+
+
 class BlueprintProject:
-    def __init__(self, name, project_dir):
+    def __init__(self, name, project_dir, cache_size=None, journal=False, backend="json"):
         self.name = name
         self.project_dir = Path(project_dir)
         self.pages = {}
         self._page_order = []
+        # 懒加载: 最多同时保留 cache_size 个页面的框对象 (LRU)，None 不限
+        self.cache_size = cache_size
+        self._loaded = OrderedDict()
+        # 日志式保存: save() 只追加变化的页面，满 compact_every 条后压缩为快照
+        self.journal = journal
+        self.compact_every = 200
+        self._generation = 0
+        self._journal_len = 0
+        # 增量保存: 自上次落盘后可能修改 / 删除的页面，save() 只处理这些
+        self._dirty = {}                  # page_id → None（有序集合）
+        self._removed = set()
+        self._saved = {}                  # 脏页首次被改前的序列化结果（仅增量模式记录）
+        self._saved_meta = None
+        # 存储后端: "json" (project.json [+ journal]) | "sqlite" (project.db)
+        self.backend = backend
+        self._store = None
+        # 链接索引: 来源页 → {目标页: 框数}，目标页 → {来源页: 框数}
+        self._links_out = {}
+        self._links_in = {}
+        self._next_id = 1                 # 自动 ID 计数器，只向前推进
+        # 近似重复: 页面图片 dHash 索引；导入时相似度 ≥ dup_similarity 视为重复
+        self.dup_similarity = DUP_SIMILARITY
+        self._phash = PHashIndex()
+        self._phash_filled = False
+
+    @property
+    def db_path(self):
+        return self.project_dir / DB_NAME
+
+    @property
+    def store(self):
+        """sqlite 后端的 SqliteStore（按需打开），json 后端为 None"""
+        if self.backend != "sqlite":
+            return None
+        if self._store is None:
+            self._store = SqliteStore(self.db_path)
+        return self._store
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    @property
+    def incremental(self):
+        """日志模式和 sqlite 后端按脏页增量保存，普通模式整体重写"""
+        return self.journal or self.backend == "sqlite"
+
+    def mark_dirty(self, page_id):
+        """
+        记下页面即将被修改（在改之前调用）。page.boxes 取用 / 赋值、页面元信息赋值
+        时自动调用；持有 page.boxes 列表跨过 save() 之后再原地修改时需手动调用
+        """
+        if page_id in self._dirty:
+            return
+        self._dirty[page_id] = None
+        page = self.pages.get(page_id)
+        if self.incremental and page is not None:
+            self._saved[page_id] = _page_json(page.to_dict())
+
+    @property
+    def journal_path(self):
+        return self.project_dir / JOURNAL_NAME
 
     @property
     def config_path(self):
@@ -83,51 +579,248 @@ class BlueprintProject:
         self.images_dir.mkdir(exist_ok=True)
         self.save()
 
-    def save(self):
+    def save(self, compact=False):
+        """
+        普通模式: 原子地重写 project.json（写临时文件 + rename）
+        日志模式: 只把变化的页面追加到 project.journal，
+                  日志满 compact_every 条或 compact=True 时压缩为新快照
+        sqlite 后端: 在一个事务里只更新变化的页面行
+        """
+        if self.backend == "sqlite":
+            self._write_sqlite()
+            return
+        if not self.journal or compact or not self.config_path.exists():
+            self._write_snapshot()
+            return
+        self._append_journal()
+        if self._journal_len >= self.compact_every:
+            self._write_snapshot()
+
+    def _page_dicts(self):
+        return {pid: self.pages[pid].to_dict() for pid in self._page_order}
+
+    def _write_snapshot(self):
+        pages = self._page_dicts()
+        self._generation += 1
         data = {
             "project_name": self.name,
+            "generation": self._generation,
             "page_order": self._page_order,
-            "pages": {pid: self.pages[pid].to_dict() for pid in self._page_order},
+            "pages": pages,
         }
-        with open(self.config_path, "w", encoding="utf-8") as f:
+        tmp = self.config_path.with_name(self.config_path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.config_path)
+        # 快照已换代，残留日志即使没删掉也不会再被重放
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self._journal_len = 0
+        self._mark_saved()
+
+    def _mark_saved(self):
+        self._dirty.clear()
+        self._removed.clear()
+        self._saved.clear()
+        self._saved_meta = (self.name, list(self._page_order))
+
+    def _changes(self):
+        """
+        只检查脏页: (变化的页面 {pid: dict}, 删除的 pid, 当前 meta)
+        取用过但内容与改前快照相同的页面不算变化
+        """
+        changed = {}
+        for pid in self._dirty:
+            page = self.pages.get(pid)
+            if page is None:
+                continue
+            d = page.to_dict()
+            if pid in self._saved and self._saved[pid] == _page_json(d):
+                continue
+            changed[pid] = d
+        return changed, list(self._removed), (self.name, list(self._page_order))
+
+    def _write_sqlite(self):
+        changed, removed, meta = self._changes()
+        if changed or removed or meta != self._saved_meta:
+            self.store.write(self.name, self._page_order, changed, removed,
+                             reorder=meta != self._saved_meta)
+        self._mark_saved()
+
+    def _append_journal(self):
+        changed, removed, meta = self._changes()
+        entries = [{"op": "page", "id": pid, "data": d} for pid, d in changed.items()]
+        entries += [{"op": "del", "id": pid} for pid in removed]
+        if meta != self._saved_meta:
+            entries.append({"op": "meta", "project_name": self.name,
+                            "page_order": list(self._page_order)})
+        if entries:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for e in entries:
+                    e["gen"] = self._generation
+                    f.write(json.dumps(e, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_len += len(entries)
+        self._mark_saved()
 
     @classmethod
-    def load(cls, project_dir):
+    def load(cls, project_dir, lazy=False, cache_size=64, journal=False, backend=None):
+        """
+        lazy=True 时只建立页面元信息 (id / 名称 / 弹出 / 图片)，
+        各页面的框在首次访问 page.boxes 时才实例化，最多缓存 cache_size 页
+        journal=True 时之后的 save() 走日志式追加；无论哪种模式都会重放已有日志
+        backend=None 时按目录内容自动识别 (见 detect_backend)
+        """
         project_dir = Path(project_dir)
-        with open(project_dir / "project.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-        proj = cls(data["project_name"], project_dir)
+        backend = backend or detect_backend(project_dir)
+        data, replayed, bad = _read_project(project_dir, backend)
+        proj = cls(data["project_name"], project_dir,
+                   cache_size=cache_size if lazy else None, journal=journal,
+                   backend=backend)
+        proj._generation = data.get("generation", 0)
+        proj._journal_len = replayed
         proj._page_order = data.get("page_order", [])
         for pid in proj._page_order:
             if pid in data.get("pages", {}):
-                proj.pages[pid] = Page.from_dict(pid, data["pages"][pid])
+                proj._add_page(Page.from_dict(pid, data["pages"][pid], lazy=lazy), new=False)
+        proj._mark_saved()
+        if bad:
+            # 坏行留在日志里，之后追加的条目会接在它后面变成同一个坏行: 立即压缩为新快照
+            print(f"⚠️ 保存日志中有 {bad} 行不完整（上次可能异常退出），压缩为新快照")
+            try:
+                proj._write_snapshot()
+            except OSError as e:
+                print(f"❌ 无法写入快照: {e}")
         return proj
 
+    # ---------- 框缓存 (懒加载) ----------
+    def _add_page(self, page, new=True):
+        self.pages[page.page_id] = page
+        page._owner = self
+        if new:
+            self._dirty[page.page_id] = None       # 新页面没有落盘快照，保存时必写
+        self.reindex_links(page.page_id)
+        self._index_phash(page)
+
+    def _touch_page(self, page):
+        if self.cache_size is None:
+            return
+        self._loaded[page.page_id] = page
+        self._loaded.move_to_end(page.page_id)
+        while len(self._loaded) > self.cache_size:
+            _, old = self._loaded.popitem(last=False)
+            old.unload_boxes()
+
     # ---------- 自动 ID ----------
     def _gen_id(self):
-        i = 1
+        i = self._next_id
         while f"page_{i:03d}" in self.pages:
             i += 1
+        self._next_id = i + 1
         return f"page_{i:03d}"
 
     # ---------- 导入 ----------
-    def import_image(self, source_path):
+    def import_image(self, source_path, on_duplicate="keep"):
+        """
+        on_duplicate: "keep" 照常导入（可用 similar_pages 提示）；
+                      "merge" 与已有页面近似重复时不导入，直接返回那个页面
+        """
         src = Path(source_path)
+        if on_duplicate == "merge":
+            dup = self._find_duplicate(dhash_file(src))
+            if dup:
+                return dup
         pid = self._gen_id()
         dest = f"{pid}{src.suffix}"
         shutil.copy2(src, self.images_dir / dest)
         page = Page(pid, name_en=pid, image_path=f"images/{dest}")
-        self.pages[pid] = page
+        page.image_info = probe_image(self.images_dir / dest)
+        self._add_page(page)
         self._page_order.append(pid)
         return page
 
-    def import_screenshot(self, pixmap):
+    def import_images(self, sources, workers=None, on_duplicate="keep"):
+        """
+        批量导入: sources 为目录、通配符 (如 shots/*.png) 或路径列表
+        ID 按计数器一次分配，复制与尺寸 / 哈希探测在线程池中并行，
+        最后一次性加入模型；调用方只需保存一次。返回新页面列表
+        on_duplicate="merge" 时先在线程池中对源文件算感知哈希，与已有页面（含本批
+        排在前面的）近似重复的直接跳过: 不复制、不探测、不占用页面 ID
+        """
+        if isinstance(sources, (str, Path)):
+            src = Path(sources)
+            if src.is_dir():
+                files = sorted(p for p in src.iterdir()
+                               if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES)
+            else:
+                files = [Path(p) for p in sorted(glob.glob(str(sources)))]
+        else:
+            files = [Path(p) for p in sources]
+        if not files:
+            return []
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashes = [None] * len(files)
+            if on_duplicate == "merge":
+                hashes = list(pool.map(dhash_file, files))
+                batch = PHashIndex(self._phash.max_distance)
+                keep = []
+                for i, ph in enumerate(hashes):
+                    if ph is not None and (self._find_duplicate(ph) or
+                                           batch.query(ph, self.dup_distance)):
+                        continue
+                    if ph is not None:
+                        batch.add(i, ph)
+                    keep.append(i)
+                files = [files[i] for i in keep]
+                hashes = [hashes[i] for i in keep]
+
+            jobs = []
+            for src, ph in zip(files, hashes):
+                pid = self._gen_id()
+                jobs.append((pid, src, self.images_dir / f"{pid}{src.suffix}", ph))
+
+            def copy_one(job):
+                _, src, dst, ph = job
+                shutil.copy2(src, dst)
+                return probe_image(dst, ph)
+
+            infos = list(pool.map(copy_one, jobs))
+
+        pages = []
+        for (pid, _, dst, _), info in zip(jobs, infos):
+            page = Page(pid, name_en=pid, image_path=f"images/{dst.name}")
+            page.image_info = info
+            self._add_page(page)
+            self._page_order.append(pid)
+            pages.append(page)
+        return pages
+
+    def import_screenshot(self, image, writer=None, on_duplicate="keep"):
+        """
+        image: QPixmap / QImage / 截图 Frame
+        给了 writer（blueprint_capture.ImageWriter）时 PNG 交给后台编码，
+        image_info 先只记感知哈希，保存时由 image_info() 补齐；保存前需 writer.flush()
+        on_duplicate 同 import_image
+        """
+        ph = dhash_image(image)
+        if on_duplicate == "merge":
+            dup = self._find_duplicate(ph)
+            if dup:
+                return dup
         pid = self._gen_id()
         dest = f"{pid}.png"
-        pixmap.save(str(self.images_dir / dest), "PNG")
         page = Page(pid, name_en=pid, image_path=f"images/{dest}")
-        self.pages[pid] = page
+        if writer is None:
+            image.save(str(self.images_dir / dest), "PNG")
+            page.image_info = probe_image(self.images_dir / dest)
+        else:
+            writer.submit(image, self.images_dir / dest)
+            page.image_info = {"phash": f"{ph:016x}"}
+        self._add_page(page)
         self._page_order.append(pid)
         return page
 
@@ -151,18 +844,221 @@ class BlueprintProject:
 
     # ---------- 删除 ----------
     def remove_page(self, page_id):
+        """删除页面及其图片，并清空其他页面指向它的链接框目标"""
         if page_id not in self.pages:
             return
         img = self.project_dir / self.pages[page_id].image_path
         if img.exists():
             img.unlink()
+        for src in list(self._links_in.get(page_id, ())):
+            if src != page_id:
+                self._clear_link_target(self.pages[src], page_id)
+        self._unindex_links(page_id)
+        self._links_in.pop(page_id, None)
+        self._phash.remove(page_id)
+        self.pages[page_id]._owner = None
         del self.pages[page_id]
+        self._dirty.pop(page_id, None)
+        self._saved.pop(page_id, None)
+        self._removed.add(page_id)
+        self._loaded.pop(page_id, None)
         self._page_order.remove(page_id)
 
+    def _clear_link_target(self, page, target):
+        self.mark_dirty(page.page_id)
+        if page.boxes_loaded:
+            for b in page._boxes:
+                if b.box_type == "link" and b.target_page == target:
+                    b.target_page = None
+        else:
+            for b in page._raw_boxes:
+                if b.get("box_type") == "link" and b.get("target_page") == target:
+                    b["target_page"] = None
+        self.reindex_links(page.page_id)
+
+    # ---------- 链接索引 ----------
+    def reindex_links(self, page_id):
+        """
+        重建某页面的出链索引；page.boxes 整体赋值时自动调用，
+        直接改动 Box.target_page 等原地修改后需手动调用
+        """
+        self._unindex_links(page_id)
+        page = self.pages.get(page_id)
+        if page is None:
+            return
+        out = {}
+        for tp in page.link_targets():
+            if tp:
+                out[tp] = out.get(tp, 0) + 1
+        self._links_out[page_id] = out
+        for tp, n in out.items():
+            self._links_in.setdefault(tp, {})[page_id] = n
+
+    def _unindex_links(self, page_id):
+        for tp in self._links_out.pop(page_id, {}):
+            srcs = self._links_in.get(tp)
+            if srcs is not None:
+                srcs.pop(page_id, None)
+                if not srcs:
+                    del self._links_in[tp]
+
+    def outgoing_links(self, page_id):
+        """page_id 上链接框指向的页面 {目标页: 框数}"""
+        return dict(self._links_out.get(page_id, {}))
+
+    def incoming_links(self, page_id):
+        """指向 page_id 的页面 {来源页: 框数}"""
+        return dict(self._links_in.get(page_id, {}))
+
+    def orphan_pages(self):
+        """没有任何其他页面链接进来的页面（按 page_order）"""
+        return [pid for pid in self._page_order
+                if not any(src != pid for src in self._links_in.get(pid, ()))]
+
+    # ---------- 图片信息 ----------
+    def image_info(self, page_id):
+        """
+        页面图片的宽高 / 大小 / 修改时间 / 哈希
+        已记录且文件 (大小, 修改时间) 未变时直接返回，否则重新探测并更新
+        """
+        page = self.pages.get(page_id)
+        if not page:
+            return None
+        path = self.project_dir / page.image_path
+        if not image_info_valid(page.image_info, path):
+            info = probe_image(path)
+            if info is None and page.image_info and "size" not in page.image_info:
+                return page.image_info      # 截图还在后台写盘，先用导入时记下的感知哈希
+            page.image_info = info
+            self._index_phash(page)
+        return page.image_info
+
+    def refresh_written_images(self, workers=None):
+        """
+        补齐截图导入时只记了感知哈希的页面信息（PNG 由后台写盘，写完后调用）
+        只探测这些页面，在线程池中并行；其余页面仍在 image_info() 取用时才检查
+        返回补齐的页面数
+        """
+        pending = [pid for pid in self._page_order
+                   if self.pages[pid].image_info and "size" not in self.pages[pid].image_info]
+        if not pending:
+            return 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            infos = list(pool.map(
+                lambda pid: probe_image(self.project_dir / self.pages[pid].image_path), pending))
+        n = 0
+        for pid, info in zip(pending, infos):
+            if info is not None:
+                self.pages[pid].image_info = info
+                self._index_phash(self.pages[pid])
+                n += 1
+        return n
+
+    # ---------- 近似重复 ----------
+    @property
+    def dup_distance(self):
+        return similarity_to_distance(self.dup_similarity)
+
+    def _index_phash(self, page):
+        ph = (page.image_info or {}).get("phash")
+        if ph:
+            self._phash.add(page.page_id, int(ph, 16))
+        else:
+            self._phash.remove(page.page_id)
+
+    def _find_duplicate(self, ph):
+        if ph is None:
+            return None
+        self._fill_phashes()
+        hits = self._phash.query(ph, self.dup_distance)
+        return self.pages[hits[0][1]] if hits else None
+
+    def _fill_phashes(self, workers=None):
+        """
+        为还没有感知哈希的页面（旧项目）在线程池中补算，整个项目只做一次
+        图片信息仍有效的只算 dHash，失效或缺失的整体重新探测（探测结果已含 dHash）
+        """
+        if self._phash_filled:
+            return
+        self._phash_filled = True
+        missing = [pid for pid in self._page_order if pid not in self._phash]
+        if not missing:
+            return
+
+        def fill(pid):
+            page = self.pages[pid]
+            path = self.project_dir / page.image_path
+            if image_info_valid(page.image_info, path):
+                return None, dhash_file(path)
+            return probe_image(path), None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fill, missing))
+        for pid, (info, ph) in zip(missing, results):
+            page = self.pages[pid]
+            if info is not None:
+                page.image_info = info
+            elif ph is not None:
+                self.mark_dirty(pid)
+                page.image_info["phash"] = f"{ph:016x}"
+            else:
+                continue
+            self._index_phash(page)
+
+    def page_phash(self, page_id):
+        """页面图片的 dHash 整数；旧项目未记录的当场计算并写入 image_info"""
+        info = self.image_info(page_id)
+        if not info:
+            return None
+        if "phash" not in info:
+            ph = dhash_file(self.project_dir / self.pages[page_id].image_path)
+            if ph is None:
+                return None
+            self.mark_dirty(page_id)
+            info["phash"] = f"{ph:016x}"
+            self._index_phash(self.pages[page_id])
+        return int(info["phash"], 16)
+
+    def similar_pages(self, target, similarity=None):
+        """
+        与 target（page_id 或 dHash 整数）近似的页面: [(page_id, 汉明距离), ...]
+        similarity 默认取 dup_similarity
+        """
+        exclude = None
+        if isinstance(target, str):
+            exclude, target = target, self.page_phash(target)
+            if target is None:
+                return []
+        dist = similarity_to_distance(similarity if similarity is not None
+                                      else self.dup_similarity)
+        return [(pid, d) for d, pid in self._phash.query(target, dist, exclude)]
+
+    def find_duplicates(self, similarity=None, workers=None):
+        """
+        全项目重复页面报告: 互相近似的页面分组 [[page_id, ...], ...]，按页面顺序
+        缺少感知哈希的页面先补算
+        """
+        self._fill_phashes(workers)
+        dist = similarity_to_distance(similarity if similarity is not None
+                                      else self.dup_similarity)
+        order = {pid: i for i, pid in enumerate(self._page_order)}
+        groups = [sorted(g, key=order.get) for g in self._phash.groups(dist)]
+        return sorted(groups, key=lambda g: order[g[0]])
+
+    def image_size(self, page_id):
+        info = self.image_info(page_id)
+        if not info:
+            return 0, 0
+        return info.get("width", 0), info.get("height", 0)
+
     def get_image_abs_path(self, page_id):
         if page_id in self.pages:
             return str(self.project_dir / self.pages[page_id].image_path)
         return None
 
+    def box_table(self):
+        """构建全项目框的列式快照，见 BoxTable"""
+        return BoxTable(self)
+
     def get_page_names(self):
         return {pid: self.pages[pid].display_name for pid in self._page_order}
\ No newline at end of file
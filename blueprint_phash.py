@@ -0,0 +1,207 @@
+"""
+blueprint_phash.py
+截图感知哈希 (dHash) + 近似重复索引
+
+    dHash: 缩成 9×8 灰度，比较每行相邻像素的明暗，得到 64 位整数；
+           两张图哈希的汉明距离越小越相似，similarity = 1 - 距离 / 64
+    PHashIndex: 把 64 位切成 max_distance+1 段分桶；距离不超过 max_distance
+                的两个哈希至少有一段完全相同（抽屉原理），查询只比较同桶候选
+
+用法:
+    python blueprint_phash.py <蓝图项目目录> [--similarity=0.94]   # 重复页面报告
+"""
+
+import sys
+
+try:
+    from PIL import Image as PILImage
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+HASH_BITS = 64
+DUP_SIMILARITY = 0.94       # 默认阈值: 64 位中至多 3 位不同
+
+
+def similarity_to_distance(similarity):
+    return max(0, int((1 - similarity) * HASH_BITS + 1e-9))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _dhash(gray):
+    """gray: 9×8 个灰度值（按行），每行 8 次相邻比较"""
+    h = 0
+    for y in range(8):
+        row = gray[y * 9:(y + 1) * 9]
+        for x in range(8):
+            h = (h << 1) | (row[x] > row[x + 1])
+    return h
+
+
+def _dhash_pil(img):
+    return _dhash(list(img.convert("L").resize((9, 8), PILImage.BOX).getdata()))
+
+
+def dhash_file(path):
+    """图片文件的 dHash；无法读取返回 None"""
+    if HAS_PIL:
+        try:
+            with PILImage.open(str(path)) as img:
+                return _dhash_pil(img)
+        except Exception:
+            return None
+    from PyQt5.QtGui import QImage
+    img = QImage(str(path))
+    return None if img.isNull() else dhash_image(img)
+
+
+def dhash_image(image):
+    """
+    内存中图像的 dHash: QImage / QPixmap / 截图 Frame（已带 phash 的直接返回）
+    有 PIL 时把像素交给与 dhash_file 相同的缩放路径，文件和截图的哈希才能互相比较；
+    像素缓冲区直接交给 PIL，不先复制一份。4K 截图约几十毫秒，应在截图线程里算
+    """
+    if getattr(image, "phash", None) is not None:
+        return image.phash
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QImage
+    if HAS_PIL and hasattr(image, "stride"):            # Frame: 本身就是 RGB888 缓冲区
+        return _dhash_pil(PILImage.frombuffer("RGB", (image.width, image.height), image.data,
+                                              "raw", "RGB", image.stride, 1))
+    if hasattr(image, "qimage"):
+        image = image.qimage()
+    elif not isinstance(image, QImage):
+        image = image.toImage()
+    if HAS_PIL:
+        if image.format() != QImage.Format_RGB888:
+            image = image.convertToFormat(QImage.Format_RGB888)
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        img = PILImage.frombuffer("RGB", (image.width(), image.height()), memoryview(bits),
+                                  "raw", "RGB", image.bytesPerLine(), 1)
+        return _dhash_pil(img)
+    small = image.scaled(9, 8, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    small = small.convertToFormat(QImage.Format_Grayscale8)
+    bits = small.constBits()
+    bits.setsize(small.sizeInBytes())
+    stride = small.bytesPerLine()
+    raw = bytes(bits)
+    return _dhash([raw[y * stride + x] for y in range(8) for x in range(9)])
+
+
+# ==================== 索引 ====================
+class PHashIndex:
+    """
+    key → 64 位哈希的近似重复索引，支持增删
+    query() 的距离上限不超过 max_distance 时走分段桶，否则退化为线性扫描
+    """
+
+    def __init__(self, max_distance=None):
+        if max_distance is None:
+            max_distance = similarity_to_distance(DUP_SIMILARITY)
+        self.max_distance = max_distance
+        n = max_distance + 1
+        # 64 位尽量均分为 n 段: [(位移, 掩码), ...]
+        self._bands = []
+        start = 0
+        for i in range(n):
+            width = HASH_BITS // n + (1 if i < HASH_BITS % n else 0)
+            self._bands.append((start, (1 << width) - 1))
+            start += width
+        self._buckets = [{} for _ in self._bands]   # 段值 → set(key)
+        self._hashes = {}                           # key → 哈希
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, key):
+        return key in self._hashes
+
+    def get(self, key):
+        return self._hashes.get(key)
+
+    def add(self, key, h):
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = h
+        for (shift, mask), bucket in zip(self._bands, self._buckets):
+            bucket.setdefault((h >> shift) & mask, set()).add(key)
+
+    def remove(self, key):
+        h = self._hashes.pop(key, None)
+        if h is None:
+            return
+        for (shift, mask), bucket in zip(self._bands, self._buckets):
+            k = (h >> shift) & mask
+            keys = bucket.get(k)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del bucket[k]
+
+    def query(self, h, max_distance=None, exclude=None):
+        """与 h 距离不超过 max_distance 的 [(距离, key), ...]，按距离升序"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            candidates = self._hashes
+        else:
+            candidates = set()
+            for (shift, mask), bucket in zip(self._bands, self._buckets):
+                candidates.update(bucket.get((h >> shift) & mask, ()))
+        hits = []
+        for key in candidates:
+            if key == exclude:
+                continue
+            d = hamming(h, self._hashes[key])
+            if d <= max_distance:
+                hits.append((d, key))
+        hits.sort()
+        return hits
+
+    def groups(self, max_distance=None):
+        """互相近似（传递闭包）的 key 分组，只返回两个以上的组"""
+        parent = {}                     # 非根 key → 上级
+
+        def find(k):
+            while k in parent:
+                k = parent[k]
+            return k
+
+        for key, h in self._hashes.items():
+            for _, other in self.query(h, max_distance, exclude=key):
+                a, b = find(key), find(other)
+                if a != b:
+                    parent[a] = b
+        groups = {}
+        for key in self._hashes:
+            groups.setdefault(find(key), []).append(key)
+        return [g for g in groups.values() if len(g) > 1]
+
+
+# ==================== 入口 ====================
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print("用法: python blueprint_phash.py <蓝图项目目录> [--similarity=0.94]")
+        sys.exit(1)
+    similarity = DUP_SIMILARITY
+    for a in sys.argv[1:]:
+        if a.startswith("--similarity="):
+            similarity = float(a.split("=", 1)[1])
+    from blueprint_model import BlueprintProject
+    proj = BlueprintProject.load(args[0], lazy=True)
+    groups = proj.find_duplicates(similarity)
+    if not groups:
+        print(f"✅ 未发现相似度 ≥ {similarity:g} 的重复页面")
+    for g in groups:
+        base = proj.page_phash(g[0])
+        print("🔁 " + ", ".join(
+            f"{pid}({proj.pages[pid].display_name}, 距离 {hamming(base, proj.page_phash(pid))})"
+            for pid in g))
+    if groups:
+        print(f"共 {len(groups)} 组，{sum(len(g) for g in groups)} 个页面")
+    proj.save()                                 # 补算的哈希写回 image_info，下次不用再算
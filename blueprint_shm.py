@@ -0,0 +1,254 @@
+"""
+blueprint_shm.py
+共享内存模板库 - 一个加载进程把模板放进共享内存，多个 bot 进程只读挂载
+
+    加载进程把 tasks/ 目录打成模板包（格式见 blueprint_bundle）写进一段共享内存，
+    各 bot 进程挂载后模板像素是这段内存上的 NumPy 只读视图: 不论开多少个实例，
+    模板只占一份物理内存。
+
+    版本切换:
+        控制段 <name>          magic "BPSHMCTL" | 当前版本 u64 | 数据长度 u64
+        数据段 <name>_<版本>   模板包内容
+    重新导出后 publish() 先写好新数据段，再改控制段里的版本号（一次 8 字节写入），
+    然后删除旧数据段的名字。已挂载旧版本的进程映射不受影响，下次调用
+    SharedTemplateStore.detector() 时发现版本变化再换到新版本。
+
+    同一个 name 只应有一个加载进程。POSIX 下共享内存在 unlink 前一直存在，加载
+    进程可以退出；Windows 下最后一个句柄关闭即释放，加载进程需保持运行（--watch）。
+
+用法:
+    python blueprint_shm.py publish <tasks目录> [--name=bp_tasks] [--watch=2]
+    python blueprint_shm.py info [--name=bp_tasks]
+    python blueprint_shm.py unlink [--name=bp_tasks]
+
+bot 端:
+    store = SharedTemplateStore("bp_tasks", levels=2, early_exit=True)
+    result = store.detector().classify(frame)      # 每次调用只读一次版本号
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+
+from blueprint_bundle import TemplateBundle, bundle_bytes
+from blueprint_detect import StateDetector
+
+DEFAULT_NAME = "bp_tasks"
+CTL_MAGIC = b"BPSHMCTL"
+CTL = struct.Struct("<8sQQ")
+ATTACH_RETRY = 5            # 挂载时恰好遇到版本切换（旧数据段已删除）的重试次数
+
+
+def _segment(name, version):
+    return f"{name}_{version}"
+
+
+def _open(name, create=False, size=0):
+    """
+    打开 / 创建共享内存段，并取消 resource_tracker 的登记: 否则本进程退出时会把
+    段删掉（加载进程退出后 bot 仍要用），挂载方退出时还会误删别人的段
+    """
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    if os.name == "posix":
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _map_readonly(name):
+    """
+    只读映射共享内存段。映射是独立的 mmap 对象，SharedMemory 句柄随即关闭:
+    模板视图只引用这个 mmap，最后一个视图释放时自动解除映射
+    """
+    shm = _open(name)
+    try:
+        if os.name == "posix":
+            return mmap.mmap(shm._fd, shm.size, access=mmap.ACCESS_READ)
+        return mmap.mmap(-1, shm.size, tagname=name, access=mmap.ACCESS_READ)
+    finally:
+        shm.close()
+
+
+def _unlink(name):
+    try:
+        shm = _open(name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    if os.name == "posix":
+        # unlink() 会向 resource_tracker 注销一次，先补登记，否则它会报告未知的段
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+    return True
+
+
+def current_version(name=DEFAULT_NAME):
+    """控制段中的当前版本，尚未发布返回 0"""
+    try:
+        ctl = _open(name)
+    except FileNotFoundError:
+        return 0
+    try:
+        magic, version, _ = CTL.unpack_from(ctl.buf, 0)
+        return version if magic == CTL_MAGIC else 0
+    finally:
+        ctl.close()
+
+
+# ==================== 加载进程 ====================
+def publish(task_dir, name=DEFAULT_NAME):
+    """
+    把 tasks 目录的模板发布为新版本并原子切换，删除旧版本的数据段。
+    返回新版本号，失败返回 None
+    """
+    data = bundle_bytes(task_dir)
+    if data is None:
+        return None
+    try:
+        ctl = _open(name)
+    except FileNotFoundError:
+        ctl = _open(name, create=True, size=CTL.size)
+        CTL.pack_into(ctl.buf, 0, CTL_MAGIC, 0, 0)
+    try:
+        magic, old, _ = CTL.unpack_from(ctl.buf, 0)
+        if magic != CTL_MAGIC:
+            print(f"❌ 共享内存 {name} 不是模板库的控制段")
+            return None
+        version = old + 1
+        seg = _open(_segment(name, version), create=True, size=len(data))
+        seg.buf[:len(data)] = data
+        seg.close()
+        # 先写好数据段再切版本号: 读到新版本号的进程一定能挂载到完整的数据
+        CTL.pack_into(ctl.buf, 0, CTL_MAGIC, version, len(data))
+    finally:
+        ctl.close()
+    if old:
+        _unlink(_segment(name, old))
+    print(f"📤 已发布 {name} v{version}（{len(data) / 1024:.1f} KB）")
+    return version
+
+
+def unpublish(name=DEFAULT_NAME):
+    """删除控制段和当前数据段（已挂载的进程不受影响）"""
+    version = current_version(name)
+    if version:
+        _unlink(_segment(name, version))
+    return _unlink(name)
+
+
+def watch(task_dir, name=DEFAULT_NAME, interval=2.0):
+    """
+    发布后保持运行，tasks 目录重新导出（states.txt / 导出清单的修改时间变化）
+    时自动发布新版本；Ctrl+C 结束
+    """
+    from blueprint_export import MANIFEST_NAME
+    task_dir = Path(task_dir)
+
+    def stamp():
+        return tuple(p.stat().st_mtime_ns if p.exists() else 0
+                     for p in (task_dir / "states.txt", task_dir / MANIFEST_NAME))
+
+    last = stamp()
+    publish(task_dir, name)
+    try:
+        while True:
+            time.sleep(interval)
+            now = stamp()
+            if now != last:
+                last = now
+                publish(task_dir, name)
+    except KeyboardInterrupt:
+        pass
+
+
+# ==================== bot 进程 ====================
+class SharedTemplateStore:
+    """
+    挂载共享内存模板库。detector() 返回当前版本的 StateDetector，
+    版本变化时自动换到新版本；options 原样传给 StateDetector.from_bundle
+    """
+
+    def __init__(self, name=DEFAULT_NAME, **options):
+        self.name = name
+        self.options = options
+        self.version = 0
+        self._ctl = None
+        self._detector = None
+
+    def _ctl_version(self):
+        if self._ctl is None:
+            try:
+                self._ctl = _open(self.name)
+            except FileNotFoundError:
+                return 0
+        magic, version, _ = CTL.unpack_from(self._ctl.buf, 0)
+        return version if magic == CTL_MAGIC else 0
+
+    def _attach(self, version):
+        seg = _segment(self.name, version)
+        mm = _map_readonly(seg)
+        bundle = TemplateBundle.from_buffer(mm, f"shm:{seg}", on_close=mm.close)
+        # 旧版本的识别器不主动关闭: 调用方可能还在用，随最后一个引用释放映射
+        return StateDetector.from_bundle(bundle, **self.options)
+
+    def detector(self):
+        """当前版本的识别器；尚未发布返回 None"""
+        for _ in range(ATTACH_RETRY):
+            version = self._ctl_version()
+            if not version:
+                return None
+            if version == self.version:
+                return self._detector
+            try:
+                self._detector = self._attach(version)
+            except FileNotFoundError:
+                continue                        # 挂载前又发布了新版本，旧段已删除
+            self.version = version
+            return self._detector
+        return self._detector
+
+    def close(self):
+        """释放挂载；调用方仍持有的识别器在其释放时才解除映射"""
+        if self._detector is not None:
+            bundle, self._detector = self._detector.bundle, None
+            try:
+                bundle.close()
+            except BufferError:
+                pass
+        if self._ctl is not None:
+            self._ctl.close()
+            self._ctl = None
+        self.version = 0
+
+
+# ==================== 入口 ====================
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    shm_name = opts.get("name", DEFAULT_NAME)
+    if not args or args[0] not in ("publish", "info", "unlink") or (
+            args[0] == "publish" and len(args) < 2):
+        print("用法: python blueprint_shm.py publish <tasks目录> [--name=bp_tasks] [--watch=2]")
+        print("      python blueprint_shm.py info [--name=bp_tasks]")
+        print("      python blueprint_shm.py unlink [--name=bp_tasks]")
+        sys.exit(1)
+    if args[0] == "publish":
+        if "watch" in opts:
+            watch(args[1], shm_name, float(opts["watch"]))
+        else:
+            sys.exit(0 if publish(args[1], shm_name) else 1)
+    elif args[0] == "info":
+        store = SharedTemplateStore(shm_name)
+        det = store.detector()
+        if det is None:
+            print(f"⚠️ {shm_name} 尚未发布")
+            sys.exit(1)
+        print(f"📦 {shm_name} v{store.version}: {len(det.states)} 个状态")
+        for section, entries in det.bundle.sections.items():
+            print(f"   {section}: {len(entries)} 条")
+        store.close()
+    else:
+        print("🗑 已删除" if unpublish(shm_name) else f"⚠️ {shm_name} 不存在")
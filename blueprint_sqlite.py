@@ -0,0 +1,159 @@
+"""
+blueprint_sqlite.py
+蓝图项目的 SQLite 存储后端 - 页面 / 框 / 链接按行存放，逐行更新
+
+    project.db
+      pages   页面元信息，ord 为 page_order 中的位置
+      boxes   每个框一行，(page_id, seq) 为主键
+      meta    project_name 等
+
+读写的数据格式与 project.json 相同（page dict），由 BlueprintProject 选择使用。
+
+用法:
+    python blueprint_sqlite.py <蓝图项目目录> to-sqlite   # project.json → project.db
+    python blueprint_sqlite.py <蓝图项目目录> to-json     # project.db → project.json
+    转换后原存储改名为 *.bak，目录中只保留一种存储
+"""
+
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+DB_NAME = "project.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    page_id    TEXT PRIMARY KEY,
+    ord        INTEGER NOT NULL,
+    name_cn    TEXT NOT NULL DEFAULT '',
+    name_en    TEXT NOT NULL DEFAULT '',
+    is_popup   INTEGER NOT NULL DEFAULT 0,
+    image      TEXT NOT NULL DEFAULT '',
+    image_info TEXT
+);
+CREATE TABLE IF NOT EXISTS boxes (
+    page_id     TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    label       TEXT NOT NULL DEFAULT '',
+    box_type    TEXT NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    target_page TEXT,
+    PRIMARY KEY (page_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_pages_name_en ON pages(name_en);
+CREATE INDEX IF NOT EXISTS idx_boxes_target ON boxes(target_page);
+"""
+
+
+class SqliteStore:
+
+    def __init__(self, path, readonly=False):
+        self.path = Path(path)
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+        else:
+            self.conn = sqlite3.connect(str(self.path), timeout=10)
+            self.conn.execute("PRAGMA journal_mode=WAL")     # 导出 / 分析工具可并发读
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # ---------- 读 ----------
+    def read_data(self):
+        """读出与 project.json 相同结构的 dict"""
+        c = self.conn
+        row = c.execute("SELECT value FROM meta WHERE key='project_name'").fetchone()
+        data = {"project_name": row[0] if row else "", "page_order": [], "pages": {}}
+        for pid, name_cn, name_en, is_popup, image, info in c.execute(
+                "SELECT page_id, name_cn, name_en, is_popup, image, image_info "
+                "FROM pages ORDER BY ord"):
+            page = {"name_cn": name_cn, "name_en": name_en, "is_popup": bool(is_popup),
+                    "image": image, "boxes": []}
+            if info:
+                page["image_info"] = json.loads(info)
+            data["page_order"].append(pid)
+            data["pages"][pid] = page
+        for pid, label, box_type, x1, y1, x2, y2, target in c.execute(
+                "SELECT page_id, label, box_type, x1, y1, x2, y2, target_page "
+                "FROM boxes ORDER BY page_id, seq"):
+            page = data["pages"].get(pid)
+            if page is None:
+                continue
+            page["boxes"].append(_box_dict(label, box_type, x1, y1, x2, y2, target))
+        return data
+
+    # ---------- 写 (单个事务) ----------
+    def write(self, name, page_order, changed, removed=(), reorder=False, replace=False):
+        """
+        changed: {page_id: page dict} 需要新增 / 覆盖的页面
+        removed: 要删除的 page_id
+        reorder: page_order 有变化时重写全部 ord
+        replace: 先清空全部页面和框（全量写入时用）
+        """
+        order = {pid: i for i, pid in enumerate(page_order)}
+        with self.conn as c:
+            if replace:
+                c.execute("DELETE FROM boxes")
+                c.execute("DELETE FROM pages")
+            c.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('project_name', ?)",
+                      (name,))
+            for pid in removed:
+                c.execute("DELETE FROM boxes WHERE page_id=?", (pid,))
+                c.execute("DELETE FROM pages WHERE page_id=?", (pid,))
+            for pid, p in changed.items():
+                info = p.get("image_info")
+                c.execute(
+                    "INSERT OR REPLACE INTO pages"
+                    "(page_id, ord, name_cn, name_en, is_popup, image, image_info) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (pid, order[pid], p.get("name_cn", ""), p.get("name_en", ""),
+                     int(bool(p.get("is_popup", False))), p.get("image", ""),
+                     json.dumps(info, ensure_ascii=False) if info else None))
+                c.execute("DELETE FROM boxes WHERE page_id=?", (pid,))
+                c.executemany(
+                    "INSERT INTO boxes(page_id, seq, label, box_type, x1, y1, x2, y2, "
+                    "target_page) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(pid, seq, b.get("label", ""), b.get("box_type", "identity"),
+                      *b["points"][0], *b["points"][1], b.get("target_page"))
+                     for seq, b in enumerate(p.get("boxes", []))])
+            if reorder:
+                c.executemany("UPDATE pages SET ord=? WHERE page_id=?",
+                              [(i, pid) for pid, i in order.items()])
+
+    # ---------- 查询 ----------
+    def incoming_links(self, page_id):
+        """指向 page_id 的所有链接框: [(来源 page_id, seq, label), ...]"""
+        return self.conn.execute(
+            "SELECT page_id, seq, label FROM boxes WHERE target_page=? "
+            "ORDER BY page_id, seq", (page_id,)).fetchall()
+
+    def pages_by_name_en(self, name_en):
+        return [r[0] for r in self.conn.execute(
+            "SELECT page_id FROM pages WHERE name_en=? ORDER BY ord", (name_en,))]
+
+
+def _box_dict(label, box_type, x1, y1, x2, y2, target):
+    d = {"label": label, "points": [[x1, y1], [x2, y2]], "box_type": box_type}
+    if box_type == "link":
+        d["target_page"] = target
+    return d
+
+
+# ==================== 入口 ====================
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[2] not in ("to-sqlite", "to-json"):
+        print("用法:")
+        print("  python blueprint_sqlite.py <蓝图项目目录> to-sqlite")
+        print("  python blueprint_sqlite.py <蓝图项目目录> to-json")
+        sys.exit(1)
+    from blueprint_model import convert_project
+    backend = "sqlite" if sys.argv[2] == "to-sqlite" else "json"
+    if convert_project(sys.argv[1], backend) is None:
+        sys.exit(1)
+    print(f"✅ 已转换为 {backend}: {sys.argv[1]}（原存储已改名为 .bak）")
@@ -0,0 +1,68 @@
+"""
+保存日志 (project.journal) 的崩溃恢复
+
+    python -m pytest tests        或    python -m unittest discover tests
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from blueprint_model import JOURNAL_NAME, BlueprintProject, read_project_data  # noqa: E402
+
+
+class JournalRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dir = Path(self.tmp) / "XYC2"
+        shutil.copytree(ROOT / "XYC2", self.dir)
+        # 先用日志模式存一次，得到带 generation 的快照和一条正常日志
+        proj = BlueprintProject.load(self.dir, journal=True)
+        proj.save(compact=True)
+        proj.pages["page_002"].name_cn = "日志前"
+        proj.save()
+        self.journal = self.dir / JOURNAL_NAME
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _write_half_line(self):
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write('{"op": "page", "id": "page_001", "data": {"name_cn": "半')
+
+    def test_save_after_half_written_line(self):
+        self._write_half_line()
+        proj = BlueprintProject.load(self.dir, lazy=True, journal=True)
+        proj.pages["page_003"].name_cn = "改动一"
+        proj.save()
+        proj.pages["page_004"].name_cn = "改动二"
+        proj.save()
+
+        data, _ = read_project_data(self.dir)
+        self.assertEqual(data["pages"]["page_002"]["name_cn"], "日志前")
+        self.assertEqual(data["pages"]["page_003"]["name_cn"], "改动一")
+        self.assertEqual(data["pages"]["page_004"]["name_cn"], "改动二")
+        reloaded = BlueprintProject.load(self.dir)
+        self.assertEqual(reloaded.pages["page_003"].name_cn, "改动一")
+        self.assertEqual(reloaded.pages["page_004"].name_cn, "改动二")
+
+    def test_replay_skips_bad_line(self):
+        gen = json.loads((self.dir / "project.json").read_text(encoding="utf-8"))["generation"]
+        self._write_half_line()
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write("\n" + json.dumps({"op": "meta", "gen": gen, "project_name": "坏行之后",
+                                       "page_order": []}) + "\n")
+        data, replayed = read_project_data(self.dir)
+        self.assertEqual(data["project_name"], "坏行之后")
+        self.assertEqual(replayed, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()